@@ -1,7 +1,12 @@
 from flask import Flask, request, Response
 from pymongo import MongoClient
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from .config import Config
+from .utils.json_provider import BSONJSONProvider
+from .utils.mongo_pool import analytics_read_preference, client_options, pool_monitor
+from .utils import metrics
+from .utils.slow_queries import slow_queries
 import logging
 
 # Configure logging
@@ -9,30 +14,88 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)      
 
 db = None
+# Same database, read from secondaries when available; for heavy read-only queries
+analytics_db = None
 
 def create_app(config_class=Config):
     app = Flask(__name__)
+    app.json = BSONJSONProvider(app)
     app.config.from_object(config_class)
+    if app.config['TRUSTED_PROXY_HOPS']:
+        # Only then is X-Forwarded-For trusted for request.remote_addr (login throttling keys on it)
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'])
     # Initialize extensions
-    CORS(app)
+    CORS(app, expose_headers=['X-Next-Cursor', 'ETag'])
     
     @app.before_request
     def before_authentication():
         if request.method.lower() == 'options':
             return Response()
     
-    global db
+    global db, analytics_db
     
     # Initialize MongoDB with the app instance, not the URI string
     try:
-        client = MongoClient(app.config["MONGO_URI"])
+        pool_monitor.init_app(app)
+        slow_queries.init_app(app)
+        client = MongoClient(
+            app.config["MONGO_URI"],
+            event_listeners=[pool_monitor, metrics.command_metrics, slow_queries],
+            **client_options(app.config)
+        )
         db = client.get_default_database()
+        analytics_db = db.with_options(read_preference=analytics_read_preference(app.config))
         app.db = db
+        app.analytics_db = analytics_db
         logger.info("MongoDB connected successfully using pymongo.")
     except Exception as e:
         logger.error(f"Error initializing MongoDB: {e}")
         raise
 
+    from app.services.auth_service import AuthService
+    from app.services.revocation_service import RevocationService
+    from app.utils.bcrypt_pool import bcrypt_pool
+    from app.utils.rate_limiter import login_throttle
+    AuthService.token_cache.maxsize = app.config['TOKEN_CACHE_SIZE']
+    bcrypt_pool.init_app(app)
+    login_throttle.init_app(app)
+    RevocationService.sync_interval = app.config['REVOCATION_SYNC_INTERVAL']
+
+    from app.services.shop_service import ShopService
+    ShopService.geo_refresh_interval = app.config['GEO_INDEX_REFRESH_INTERVAL']
+    ShopService.geo_full_reload_interval = app.config['GEO_INDEX_FULL_RELOAD_INTERVAL']
+
+    from app.services.catalog_service import CatalogService
+    from app.services.pricing_service import PricingService
+    CatalogService.ttl = app.config['CATALOG_TTL']
+    PricingService.price_tables.maxsize = app.config['PRICE_TABLE_CACHE_SIZE']
+    PricingService.ttl = app.config['PRICE_TABLE_TTL']
+
+    from app.services.order_events import order_events
+    order_events.init_app(app)
+
+    from app.services.geocoding_service import GeocodingService, geocoding_worker
+    GeocodingService.init_app(app)
+    geocoding_worker.init_app(app)
+
+    metrics.init_app(app)
+
+    from app.utils.profiling import profiler
+    profiler.init_app(app)
+
+    from app.commands import indexes_cli, stats_cli, geocode_cli, slow_queries_cli, auth_cli
+    from app.models.indexes import load_models
+    app.cli.add_command(indexes_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(geocode_cli)
+    app.cli.add_command(slow_queries_cli)
+    app.cli.add_command(auth_cli)
+    if app.config['AUTO_CREATE_INDEXES']:
+        try:
+            load_models().apply(db)
+        except Exception as e:
+            logger.error(f"Error applying indexes: {e}")
+
     # Register blueprints
     from app.routes.auth import auth_bp
     from app.routes.customer import customer_bp
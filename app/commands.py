@@ -0,0 +1,87 @@
+import json
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app.models.indexes import load_models
+
+indexes_cli = AppGroup('indexes', help='Manage MongoDB indexes declared by the models.')
+stats_cli = AppGroup('stats', help='Maintain precomputed shop statistics.')
+geocode_cli = AppGroup('geocode', help='Fill in missing shop and address coordinates.')
+auth_cli = AppGroup('auth', help='Inspect authentication state.')
+slow_queries_cli = AppGroup('slow-queries', help='Inspect recorded slow MongoDB commands.')
+
+@indexes_cli.command('apply')
+def apply_indexes():
+    """Create any declared index that is missing"""
+    report = load_models().apply(current_app.db)
+    click.echo(json.dumps(report, indent=2, default=str))
+
+@indexes_cli.command('check')
+def check_indexes():
+    """Report missing, extra and divergent indexes per collection"""
+    report = load_models().check(current_app.db)
+    click.echo(json.dumps(report, indent=2, default=str))
+    if any(r['missing'] or r['divergent'] for r in report.values()):
+        raise SystemExit(1)
+
+@stats_cli.command('rebuild')
+@click.option('--shop-id', default=None, help='Only rebuild this shop.')
+def rebuild_stats(shop_id):
+    """Recompute shop_daily_stats from raw orders.
+
+    Dashboards read rollups only after the first full rebuild; run it once
+    after deploying with DASHBOARD_USE_ROLLUPS on.
+    """
+    from app.services.stats_service import ShopStatsService
+    count = ShopStatsService.rebuild(shop_id)
+    click.echo(f"Rebuilt {count} daily rollup documents")
+
+@stats_cli.command('reconcile-counters')
+@click.option('--shop-id', default=None, help='Only check this shop.')
+@click.option('--dry-run', is_flag=True, help='Report drift without fixing it.')
+def reconcile_counters(shop_id, dry_run):
+    """Detect and fix drift in the order board lane counters"""
+    from app.services.stats_service import ShopStatsService
+    drift = ShopStatsService.reconcile_counters(shop_id, fix=not dry_run)
+    click.echo(json.dumps(drift, indent=2))
+    skipped = sum(1 for shop in drift if shop['skipped'])
+    click.echo(f"{len(drift)} shop(s) drifted" + ('' if dry_run else f", {len(drift) - skipped} fixed, "
+                                                  f"{skipped} skipped (recent orders; run again)"))
+
+@geocode_cli.command('run')
+@click.option('--limit', default=None, type=int, help='Items per batch.')
+@click.option('--all', 'until_done', is_flag=True, help='Keep running batches until nothing is left.')
+def run_geocoding(limit, until_done):
+    """Geocode shops and customer addresses that have no coordinates"""
+    from app.services.geocoding_service import GeocodingService
+    if GeocodingService.geocoder is None:
+        raise click.ClickException('No geocoder configured (GEOCODER_BACKEND=none)')
+    while True:
+        result = GeocodingService.run_batch(limit)
+        click.echo(json.dumps(result))
+        if not until_done or not (result['shops'] or result['addresses']):
+            break
+
+@geocode_cli.command('status')
+def geocode_status():
+    """Show how many shops and addresses still lack coordinates"""
+    from app.services.geocoding_service import GeocodingService
+    click.echo(json.dumps(GeocodingService.pending_counts(), indent=2))
+
+@auth_cli.command('throttle-status')
+def throttle_status():
+    """Show failed-login counts and lockouts per email/IP key"""
+    from app.utils.rate_limiter import login_throttle
+    click.echo(json.dumps({
+        'stats': login_throttle.stats(),
+        'keys': login_throttle.status()
+    }, indent=2))
+
+@slow_queries_cli.command('top')
+@click.option('--limit', default=20, type=int, help='Number of filter shapes to show.')
+def top_slow_queries(limit):
+    """Show the filter shapes that spent the most time in slow commands"""
+    from app.utils.slow_queries import slow_queries, top_shapes
+    if not slow_queries.collection:
+        raise click.ClickException('Slow queries are only logged (MONGO_SLOW_QUERY_COLLECTION is empty)')
+    click.echo(json.dumps(top_shapes(current_app.db, slow_queries.collection, limit), indent=2, default=str))
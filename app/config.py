@@ -9,12 +9,84 @@ class Config:
     
     # MongoDB Config
     MONGO_URI = os.getenv('MONGO_URI')
+    AUTO_CREATE_INDEXES = os.getenv('AUTO_CREATE_INDEXES', 'true').lower() == 'true'
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))  # connections per process
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 0)) or None
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 0)) or None  # max wait for a free connection
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 10000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 0)) or None
+    MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS') or None  # e.g. 'zstd,snappy,zlib'
+    MONGO_ZLIB_LEVEL = int(os.getenv('MONGO_ZLIB_LEVEL', -1))
+    MONGO_ANALYTICS_READ_PREFERENCE = os.getenv('MONGO_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+    MONGO_ANALYTICS_MAX_STALENESS = int(os.getenv('MONGO_ANALYTICS_MAX_STALENESS', 0)) or None  # seconds, >= 90
+    MONGO_SLOW_CHECKOUT_MS = int(os.getenv('MONGO_SLOW_CHECKOUT_MS', 100))  # log pool waits above this
+    MONGO_SLOW_QUERY_ENABLED = os.getenv('MONGO_SLOW_QUERY_ENABLED', 'true').lower() == 'true'
+    MONGO_SLOW_QUERY_MS = int(os.getenv('MONGO_SLOW_QUERY_MS', 100))  # record commands slower than this
+    MONGO_SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('MONGO_SLOW_QUERY_EXPLAIN_RATE', 0.1))  # share of slow commands explained
+    MONGO_SLOW_QUERY_EXPLAIN_INTERVAL = int(os.getenv('MONGO_SLOW_QUERY_EXPLAIN_INTERVAL', 600))  # seconds between explains of one shape
+    MONGO_SLOW_QUERY_COLLECTION = os.getenv('MONGO_SLOW_QUERY_COLLECTION', 'slow_queries')  # capped collection; empty to only log
+    MONGO_SLOW_QUERY_COLLECTION_SIZE = int(os.getenv('MONGO_SLOW_QUERY_COLLECTION_SIZE', 16 * 1024 * 1024))  # bytes
     
     # JWT Config
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
     JWT_ACCESS_TOKEN_EXPIRES = 24 * 60 * 60  # 24 hours
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))  # verified tokens kept per process
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', 0))  # 0 = one worker per CPU
+    BCRYPT_MAX_QUEUE = int(os.getenv('BCRYPT_MAX_QUEUE', 64))  # pending hashes before 503
+    BCRYPT_TIMEOUT = int(os.getenv('BCRYPT_TIMEOUT', 10))  # seconds
+    REVOCATION_SYNC_INTERVAL = int(os.getenv('REVOCATION_SYNC_INTERVAL', 5))  # seconds between revocation pulls
+
+    # Login throttling ('memory' per process, 'mongo' shared across workers)
+    LOGIN_THROTTLE_BACKEND = os.getenv('LOGIN_THROTTLE_BACKEND', 'memory')
+    LOGIN_FAILURE_WINDOW = int(os.getenv('LOGIN_FAILURE_WINDOW', 15 * 60))  # seconds
+    LOGIN_MAX_FAILURES_PER_EMAIL = int(os.getenv('LOGIN_MAX_FAILURES_PER_EMAIL', 5))
+    LOGIN_MAX_FAILURES_PER_IP = int(os.getenv('LOGIN_MAX_FAILURES_PER_IP', 20))
+    LOGIN_DELAY_AFTER = int(os.getenv('LOGIN_DELAY_AFTER', 3))  # free failures before delays start
+    LOGIN_BASE_DELAY = int(os.getenv('LOGIN_BASE_DELAY', 1))  # seconds, doubled per extra failure
+    LOGIN_MAX_DELAY = int(os.getenv('LOGIN_MAX_DELAY', 60))  # seconds
+    LOGIN_THROTTLE_MAX_KEYS = int(os.getenv('LOGIN_THROTTLE_MAX_KEYS', 100000))  # memory backend only
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 0))  # X-Forwarded-For hops set by our own proxies
     
     # App Config
+    DASHBOARD_USE_ROLLUPS = os.getenv('DASHBOARD_USE_ROLLUPS', 'true').lower() == 'true'
+    GEO_INDEX_ENABLED = os.getenv('GEO_INDEX_ENABLED', 'true').lower() == 'true'
+    GEO_INDEX_REFRESH_INTERVAL = int(os.getenv('GEO_INDEX_REFRESH_INTERVAL', 30))  # seconds
+    GEO_INDEX_FULL_RELOAD_INTERVAL = int(os.getenv('GEO_INDEX_FULL_RELOAD_INTERVAL', 600))  # seconds
+    ROUTE_MAX_STOPS = int(os.getenv('ROUTE_MAX_STOPS', 1000))
+    GEOCODER_BACKEND = os.getenv('GEOCODER_BACKEND', 'nominatim')  # nominatim, static or none
+    GEOCODER_USER_AGENT = os.getenv('GEOCODER_USER_AGENT', 'pressto-backend')
+    GEOCODER_TIMEOUT = int(os.getenv('GEOCODER_TIMEOUT', 10))  # seconds
+    GEOCODER_MIN_DELAY = float(os.getenv('GEOCODER_MIN_DELAY', 1.0))  # seconds between requests
+    GEOCODER_COUNTRY_CODES = os.getenv('GEOCODER_COUNTRY_CODES') or None
+    GEOCODER_STATIC_FILE = os.getenv('GEOCODER_STATIC_FILE')  # JSON {"address|zip": [lng, lat]}
+    GEOCODE_WORKER_ENABLED = os.getenv('GEOCODE_WORKER_ENABLED', 'false').lower() == 'true'
+    GEOCODE_INTERVAL = int(os.getenv('GEOCODE_INTERVAL', 60))  # seconds between batches
+    GEOCODE_BATCH_SIZE = int(os.getenv('GEOCODE_BATCH_SIZE', 50))
+    GEOCODE_RETRY_AFTER = int(os.getenv('GEOCODE_RETRY_AFTER', 6 * 3600))  # seconds
+    CATALOG_TTL = int(os.getenv('CATALOG_TTL', 60))  # seconds before the shop catalog is rebuilt anyway
+    BULK_ORDER_MAX = int(os.getenv('BULK_ORDER_MAX', 100))
+    PRICE_TABLE_CACHE_SIZE = int(os.getenv('PRICE_TABLE_CACHE_SIZE', 5000))  # shops kept per process
+    PRICE_TABLE_TTL = int(os.getenv('PRICE_TABLE_TTL', 60))  # seconds
+    ORDER_EVENTS_SOURCE = os.getenv('ORDER_EVENTS_SOURCE', 'local')  # local, change_stream or poll
+    ORDER_EVENTS_POLL_INTERVAL = float(os.getenv('ORDER_EVENTS_POLL_INTERVAL', 2))  # seconds
+    ORDER_EVENTS_QUEUE_SIZE = int(os.getenv('ORDER_EVENTS_QUEUE_SIZE', 100))  # per connection
+    ORDER_EVENTS_HEARTBEAT = int(os.getenv('ORDER_EVENTS_HEARTBEAT', 15))  # seconds
+    ORDER_EVENTS_MAX_DURATION = int(os.getenv('ORDER_EVENTS_MAX_DURATION', 300))  # seconds per connection
+    ORDER_EVENTS_REPLAY_TTL = int(os.getenv('ORDER_EVENTS_REPLAY_TTL', 600))  # seconds a quiet shop's replay buffer is kept
+    ORDER_EVENTS_REPLAY_SHOPS = int(os.getenv('ORDER_EVENTS_REPLAY_SHOPS', 1000))  # replay buffers kept per process
+    ORDER_SYNC_LAG = int(os.getenv('ORDER_SYNC_LAG', 2))  # seconds the sync token trails real time
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # bearer token /metrics requires; needed when enabled
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')  # required when profiling is enabled
+    PROFILING_DIR = os.getenv('PROFILING_DIR', 'profiles')
+    PROFILING_SAMPLE_INTERVAL = float(os.getenv('PROFILING_SAMPLE_INTERVAL', 0.005))  # seconds between stack samples
+    PROFILING_MAX_SECONDS = int(os.getenv('PROFILING_MAX_SECONDS', 60))  # longest profiling window
+    DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 100))
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
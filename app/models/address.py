@@ -1,7 +1,16 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel
+from .indexes import registry
 
 class Address:
+    INDEXES = [
+        IndexModel([("user_id", 1)]),
+        IndexModel([("pincode", 1)]),
+        # Compound index for user_id and is_default
+        IndexModel([("user_id", 1), ("is_default", 1)])
+    ]
+
     def __init__(self, user_id, street, city, state, pincode, landmark=None, 
                  is_default=False, address_type='home', created_at=None, 
                  updated_at=None, _id=None):
@@ -74,13 +83,7 @@ class Address:
     @staticmethod
     def create_indexes(db):
         """Create necessary indexes for the addresses collection"""
-        db.addresses.create_index([("user_id", 1)])
-        db.addresses.create_index([("pincode", 1)])
-        # Compound index for user_id and is_default
-        db.addresses.create_index([
-            ("user_id", 1), 
-            ("is_default", 1)
-        ])
+        return registry.apply(db, ['addresses'])
 
     @classmethod
     def get_user_addresses(cls, db, user_id):
@@ -168,4 +171,6 @@ class Address:
             {"$set": address_dict},
             upsert=True
         )
-        return result.upserted_id or self._id
\ No newline at end of file
+        return result.upserted_id or self._id
+
+registry.register('addresses', Address.INDEXES)
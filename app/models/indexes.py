@@ -0,0 +1,91 @@
+import logging
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Index options compared when deciding whether an index has diverged
+COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+class IndexRegistry:
+    """Single declaration point for every MongoDB index the app relies on.
+
+    Models (and services owning their own collections) register
+    ``pymongo.IndexModel`` lists per collection. ``apply`` creates whatever
+    is missing and is safe to run on every start; ``check`` reports missing,
+    extra and divergent indexes without changing anything.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+
+    def register(self, collection, indexes):
+        declared = self._indexes.setdefault(collection, {})
+        for index in indexes:
+            declared[index.document['name']] = index
+
+    def collections(self):
+        return sorted(self._indexes)
+
+    def check(self, db, collections=None):
+        report = {}
+        for collection in collections or self.collections():
+            declared = self._indexes.get(collection, {})
+            existing = db[collection].index_information()
+            existing.pop('_id_', None)
+            missing, divergent = [], []
+            for name, index in declared.items():
+                info = existing.get(name)
+                if info is None:
+                    missing.append(name)
+                    continue
+                differences = self._differences(index.document, info)
+                if differences:
+                    divergent.append({'name': name, 'differences': differences})
+            report[collection] = {
+                'missing': missing,
+                'extra': sorted(name for name in existing if name not in declared),
+                'divergent': divergent
+            }
+        return report
+
+    def apply(self, db, collections=None):
+        """Create missing indexes; divergent and extra ones are only reported"""
+        report = self.check(db, collections)
+        for collection, result in report.items():
+            created, errors = [], []
+            for name in result['missing']:
+                try:
+                    db[collection].create_indexes([self._indexes[collection][name]])
+                    created.append(name)
+                except OperationFailure as e:
+                    errors.append({'name': name, 'error': str(e)})
+                    logger.error(f"Error creating index {collection}.{name}: {str(e)}")
+            result['created'] = created
+            result['errors'] = errors
+            if result['divergent']:
+                logger.warning(f"Divergent indexes on {collection}: {result['divergent']}")
+        return report
+
+    @staticmethod
+    def _differences(document, info):
+        differences = {}
+        declared_key = [(field, direction) for field, direction in document['key'].items()]
+        existing_key = [(field, direction) for field, direction in info['key']]
+        if declared_key != existing_key:
+            differences['key'] = {'declared': declared_key, 'existing': existing_key}
+        for option in COMPARED_OPTIONS:
+            declared_value = document.get(option)
+            existing_value = info.get(option)
+            if option in ('unique', 'sparse'):
+                declared_value, existing_value = bool(declared_value), bool(existing_value)
+            if declared_value != existing_value:
+                differences[option] = {'declared': declared_value, 'existing': existing_value}
+        return differences
+
+
+registry = IndexRegistry()
+
+def load_models():
+    """Import every model module so its indexes are registered"""
+    from app.models import address, order, shop, supoort_ticket, user  # noqa: F401
+    return registry
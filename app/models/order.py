@@ -1,11 +1,45 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel
+from .indexes import registry
 
 class Order:
-    VALID_STATUSES = ['Pending', 'Accepted', 'PickedUp', 'InProgress', 'Completed', 'Delivered', 'Cancelled']
+    INDEXES = [
+        # Keyset pagination over (created_at, _id), optionally per status
+        IndexModel([("customer_id", 1), ("created_at", -1), ("_id", -1)]),
+        IndexModel([("customer_id", 1), ("status", 1), ("created_at", -1), ("_id", -1)]),
+        IndexModel([("shop_id", 1), ("created_at", -1), ("_id", -1)]),
+        IndexModel([("shop_id", 1), ("status", 1), ("created_at", -1), ("_id", -1)]),
+        IndexModel([("status", 1)]),
+        # Incremental customer sync over (updated_at, _id)
+        IndexModel([("customer_id", 1), ("updated_at", 1), ("_id", 1)]),
+        # Polling source for the order event stream
+        IndexModel([("updated_at", 1)])
+    ]
+
+    VALID_STATUSES = ['pending', 'accepted', 'pickedUp', 'inProgress', 'completed', 'delivered', 'cancelled']
+
+    # The one transition table; OrderStateMachine enforces it
+    TRANSITIONS = {
+        'pending': ['accepted', 'cancelled'],
+        'accepted': ['pickedUp', 'cancelled'],
+        'pickedUp': ['inProgress', 'cancelled'],
+        'inProgress': ['completed', 'cancelled'],
+        'completed': ['delivered'],
+        'delivered': [],
+        'cancelled': []
+    }
+
+    # Order board lanes, keyed by the stored (lowercase) statuses
+    STATUS_GROUPS = {
+        'new': ['pending'],
+        'processing': ['accepted', 'pickedUp', 'inProgress'],
+        'ready': ['completed'],
+        'history': ['delivered', 'cancelled']
+    }
     
     def __init__(self, customer_id, shop_id, items, pickup_time, delivery_time,
-                 status='Pending', total_amount=0, pickup_address=None, 
+                 status='pending', total_amount=0, pickup_address=None, 
                  special_instructions=None, created_at=None, updated_at=None, _id=None):
         self._id = _id if _id else ObjectId()
         self.customer_id = customer_id
@@ -27,14 +61,6 @@ class Order:
         return errors
 
     def can_transition_to(self, new_status):
-        """Define valid status transitions"""
-        valid_transitions = {
-            'Pending': ['Accepted', 'Cancelled'],
-            'Accepted': ['PickedUp', 'Cancelled'],
-            'PickedUp': ['InProgress', 'Cancelled'],
-            'InProgress': ['Completed', 'Cancelled'],
-            'Completed': ['Delivered'],
-            'Delivered': [],
-            'Cancelled': []
-        }
-        return new_status in valid_transitions.get(self.status, [])
\ No newline at end of file
+        return new_status in self.TRANSITIONS.get(self.status, [])
+
+registry.register('orders', Order.INDEXES)
@@ -1,8 +1,19 @@
 # models/shop.py
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel
+from .indexes import registry
 
 class Shop:
+    INDEXES = [
+        IndexModel([("location", "2dsphere")]),
+        IndexModel([("owner_id", 1)]),
+        IndexModel([("status", 1)]),
+        IndexModel([("name", 1)]),
+        # Incremental refresh of the in-memory geo index
+        IndexModel([("updated_at", 1)])
+    ]
+
     def __init__(self, name, owner_id, address, location,
                  business_hours, contact_info, services=None, status='active',
                  rating=0, total_orders=0, created_at=None, updated_at=None, _id=None):
@@ -35,4 +46,6 @@ class Shop:
             'total_orders': self.total_orders,
             'created_at': self.created_at,
             'updated_at': self.updated_at
-        }
\ No newline at end of file
+        }
+
+registry.register('shops', Shop.INDEXES)
@@ -1,7 +1,13 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel
+from .indexes import registry
 
 class SupportTicket:
+    INDEXES = [
+        IndexModel([("user_id", 1), ("created_at", -1), ("_id", -1)])
+    ]
+
     def __init__(self, user_id, type, subject, message, name, email, 
                  phone=None, status='open', created_at=None, updated_at=None, _id=None):
         self._id = _id if _id else ObjectId()
@@ -60,4 +66,6 @@ class SupportTicket:
         
         allowed_types = ['bug', 'feature', 'general', 'account']
         if self.type not in allowed_types:
-            raise ValueError(f'Invalid ticket type. Must be one of: {", ".join(allowed_types)}')
\ No newline at end of file
+            raise ValueError(f'Invalid ticket type. Must be one of: {", ".join(allowed_types)}')
+
+registry.register('support_tickets', SupportTicket.INDEXES)
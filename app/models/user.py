@@ -1,7 +1,13 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel
+from .indexes import registry
 
 class User:
+    INDEXES = [
+        IndexModel([("email", 1)], unique=True)
+    ]
+
     def __init__(self, name, email, phone, password_hash, user_type, 
                  created_at=None, updated_at=None, _id=None):
         self._id = _id if _id else ObjectId()
@@ -35,4 +41,6 @@ class User:
             created_at=data.get('created_at'),
             updated_at=data.get('updated_at'),
             _id=data.get('_id')
-        )
\ No newline at end of file
+        )
+
+registry.register('users', User.INDEXES)
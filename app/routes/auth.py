@@ -1,34 +1,13 @@
 from flask import Blueprint, request, jsonify, g
 from app.services.auth_service import AuthService
+from app.utils.bcrypt_pool import PoolSaturatedError
+from app.utils.decorators import token_required
+from app.utils.rate_limiter import LoginThrottledError
 import logging
-from functools import wraps
 
 logger = logging.getLogger(__name__)
 auth_bp = Blueprint('auth', __name__)
 
-def token_required(f):
-    """Decorator to verify JWT token and attach user to request context"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        
-        # Get token from header
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(' ')[1]
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-            
-        try:
-            # Verify token and store user info in Flask's g object
-            current_user = AuthService.verify_token(token)
-            g.user = current_user
-        except Exception as e:
-            return jsonify({'error': 'Token is invalid'}), 401
-            
-        return f(*args, **kwargs)
-    return decorated
-
 @auth_bp.route('/register/customer', methods=['POST'])
 def register_customer():
     """Register a new customer and return JWT token"""
@@ -47,6 +26,9 @@ def register_customer():
     except ValueError as e:
         logger.warning(f"Customer registration validation error: {str(e)}")
         return jsonify({'error': str(e)}), 400
+    except PoolSaturatedError as e:
+        logger.warning("Customer registration rejected, bcrypt pool saturated")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Customer registration failed: {str(e)}")
         return jsonify({'error': 'Registration failed'}), 500
@@ -80,6 +62,9 @@ def register_shop():
     except ValueError as e:
         logger.warning(f"Shop registration validation error: {str(e)}")
         return jsonify({'error': str(e)}), 400
+    except PoolSaturatedError as e:
+        logger.warning("Shop registration rejected, bcrypt pool saturated")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Shop registration failed: {str(e)}")
         return jsonify({'error': 'Registration failed'}), 500
@@ -94,7 +79,8 @@ def login():
 
         result = AuthService.login_user(
             email=data.get('email'),
-            password=data.get('password')
+            password=data.get('password'),
+            client_ip=request.remote_addr
         )
         # Set token in response header
         response = jsonify(result)
@@ -103,6 +89,14 @@ def login():
     except ValueError as e:
         logger.warning(f"Login validation error: {str(e)}")
         return jsonify({'error': str(e)}), 401
+    except LoginThrottledError as e:
+        logger.warning(f"Login throttled: {str(e)}")
+        response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    except PoolSaturatedError as e:
+        logger.warning("Login rejected, bcrypt pool saturated")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Login failed: {str(e)}")
         return jsonify({'error': 'Login failed'}), 500
@@ -123,18 +117,28 @@ def verify_token():
         return jsonify({'error': str(e)}), 401
 
 @auth_bp.route('/logout', methods=['POST'])
-@token_required
 def logout():
-    """Invalidate JWT token"""
+    """Invalidate JWT token.
+
+    Not behind ``token_required``, so logging out with an expired token
+    succeeds idempotently instead of failing with 401.
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return jsonify({'error': 'No authorization header'}), 401
     try:
-        # Get token from header
-        token = request.headers['Authorization'].split(' ')[1]
-        # Add token to blacklist (you'll need to implement token blacklisting)
-        # AuthService.blacklist_token(token)
+        parts = auth_header.split(' ')
+        if len(parts) != 2:
+            raise ValueError('Invalid token')
+        token = parts[1]
+        invalidated = AuthService.blacklist_token(token)
         return jsonify({
             'message': 'Successfully logged out',
-            'token_invalidated': True
+            'token_invalidated': invalidated
         }), 200
+    except ValueError as e:
+        logger.warning(f"Logout with invalid token: {str(e)}")
+        return jsonify({'error': str(e)}), 401
     except Exception as e:
         logger.error(f"Logout failed: {str(e)}")
         return jsonify({'error': 'Logout failed'}), 500
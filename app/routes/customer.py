@@ -1,27 +1,24 @@
 from flask import Blueprint, request, jsonify
 from app.services.customer_service import CustomerService
 from app.utils.decorators import login_required
-from bson import json_util
-import json
+from app.utils.conditional import conditional_on
+from app.utils.pagination import decode_cursor, get_page_params, paginated_response
+import logging
 
-customer_bp = Blueprint('customer', __name__)
+logger = logging.getLogger(__name__)
 
-# Status mapping for order types
-ORDER_TYPE_STATUSES = {
-    'active': ['pending', 'accepted', 'pickedUp', 'inProgress', 'completed'],
-    'history': ['delivered', 'cancelled']
-}
+customer_bp = Blueprint('customer', __name__)
 
 @customer_bp.route('/profile', methods=['GET'])
 @login_required
+@conditional_on('users', lambda current_user: current_user['user_id'])
 def get_profile(current_user):
     try:
         if current_user['user_type'] != 'customer':
             return jsonify({'error': 'Unauthorized'}), 403
             
         profile = CustomerService.get_profile(current_user['user_id'])
-        profile_json = json_util.dumps(profile)
-        return jsonify(json.loads(profile_json)), 200
+        return jsonify(profile), 200
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
@@ -68,8 +65,7 @@ def get_addresses(current_user):
             return jsonify({'error': 'Unauthorized'}), 403
             
         addresses = CustomerService.get_addresses(current_user['user_id'])
-        addresses_json = json_util.dumps(addresses)
-        return jsonify(json.loads(addresses_json)), 200
+        return jsonify(addresses), 200
     except Exception as e:
         return jsonify({'error': 'Failed to fetch addresses'}), 500
 
@@ -95,14 +91,38 @@ def get_customer_orders(current_user):
             return jsonify({'error': 'Unauthorized'}), 403
 
         # Get all orders without filtering by type
-        orders = CustomerService.get_order_by_status(current_user)
-        orders_json = json_util.dumps(orders)
-        
-        return jsonify(json.loads(orders_json)), 200
+        limit, cursor = get_page_params(request.args)
+        orders, next_cursor = CustomerService.get_order_by_status(
+            current_user, limit=limit, cursor=cursor
+        )
+        return paginated_response(orders, next_cursor), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_customer_orders: {str(e)}")
         return jsonify({'error': 'Failed to fetch orders'}), 500
 
+@customer_bp.route('/orders/sync', methods=['GET'])
+@login_required
+def sync_customer_orders(current_user):
+    try:
+        if current_user['user_type'] != 'customer':
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        since = request.args.get('since')
+        limit, _ = get_page_params(request.args)
+        orders, token, has_more = CustomerService.sync_orders(
+            current_user['user_id'],
+            limit=limit,
+            since=decode_cursor(since) if since else None
+        )
+        return jsonify({'orders': orders, 'since': token, 'hasMore': has_more}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in sync_customer_orders: {str(e)}")
+        return jsonify({'error': 'Failed to sync orders'}), 500
+
 @customer_bp.route('/orders/dashboard', methods=['GET'])
 @login_required
 def get_dashboard_orders(current_user):
@@ -111,19 +131,26 @@ def get_dashboard_orders(current_user):
             return jsonify({'error': 'Unauthorized'}), 403
             
         # Get active orders for dashboard
-        orders = CustomerService.get_order_by_status(current_user, 'active')
+        limit, cursor = get_page_params(request.args)
+        orders, next_cursor = CustomerService.get_order_by_status(
+            current_user, 'active', limit=limit, cursor=cursor
+        )
+        counts = CustomerService.get_order_counts(current_user['user_id'])
         
         # Format response for dashboard
         response = {
             'activeOrders': orders,
             'orderCounts': {
-                'pending': sum(1 for order in orders if order['status'] == 'pending'),
-                'processing': sum(1 for order in orders if order['status'] in ['accepted', 'pickedUp', 'inProgress']),
-                'ready': sum(1 for order in orders if order['status'] == 'completed'),
-            }
+                'pending': counts.get('pending', 0),
+                'processing': sum(counts.get(status, 0) for status in ['accepted', 'pickedUp', 'inProgress']),
+                'ready': counts.get('completed', 0),
+            },
+            'nextCursor': next_cursor
         }
         
         return jsonify(response), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_dashboard_orders: {str(e)}")
         return jsonify({'error': 'Failed to fetch dashboard orders'}), 500
@@ -136,8 +163,7 @@ def get_order_details(current_user, order_id):
             return jsonify({'error': 'Unauthorized'}), 403
 
         order = CustomerService.get_order_details(current_user['user_id'], order_id)
-        order_json = json_util.dumps(order)
-        return jsonify(json.loads(order_json)), 200
+        return jsonify(order), 200
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
@@ -151,10 +177,13 @@ def get_order_history(current_user):
             return jsonify({'error': 'Unauthorized'}), 403
 
         # Get completed and cancelled orders
-        orders = CustomerService.get_order_by_status(current_user, 'history')
-        orders_json = json_util.dumps(orders)
-        
-        return jsonify(json.loads(orders_json)), 200
+        limit, cursor = get_page_params(request.args)
+        orders, next_cursor = CustomerService.get_order_by_status(
+            current_user, 'history', limit=limit, cursor=cursor
+        )
+        return paginated_response(orders, next_cursor), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_order_history: {str(e)}")
         return jsonify({'error': 'Failed to fetch order history'}), 500
\ No newline at end of file
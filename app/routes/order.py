@@ -1,8 +1,8 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app.services.order_service import OrderService
+from app.services.pricing_service import PricingService
 from app.utils.decorators import login_required
-from bson import json_util
-import json
+from app.utils.pagination import get_page_params, paginated_response
 
 orders_bp = Blueprint('orders', __name__)
 
@@ -20,8 +20,7 @@ def create_order(current_user):
             items=data['items'],
             pickup_date=data['pickup_date'],
             pickup_address=data['pickup_address'],
-            special_instructions=data.get('special_instructions'),
-            total_amount=data.get('total_amount')
+            special_instructions=data.get('special_instructions')
         )
         return jsonify({'order_id': order_id}), 201
     except ValueError as e:
@@ -29,6 +28,46 @@ def create_order(current_user):
     except Exception as e:
         return jsonify({'error': 'Failed to create order'}), 500
 
+@orders_bp.route('/quote', methods=['POST'])
+@login_required
+def quote_order(current_user):
+    try:
+        data = request.get_json() or {}
+        if not data.get('shop_id'):
+            return jsonify({'error': 'shop_id is required'}), 400
+        quote = PricingService.quote(data['shop_id'], data.get('items'))
+        return jsonify(quote), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to price order'}), 500
+
+@orders_bp.route('/bulk', methods=['POST'])
+@login_required
+def create_orders_bulk(current_user):
+    try:
+        if current_user['user_type'] != 'customer':
+            return jsonify({'error': 'Only customers can create orders'}), 403
+
+        data = request.get_json() or {}
+        entries = data.get('orders') if isinstance(data, dict) else data
+        if not isinstance(entries, list) or not entries:
+            return jsonify({'error': 'orders must be a non-empty list'}), 400
+        max_orders = current_app.config['BULK_ORDER_MAX']
+        if len(entries) > max_orders:
+            return jsonify({'error': f'At most {max_orders} orders per request'}), 400
+
+        results = OrderService.create_orders_bulk(current_user['user_id'], entries)
+        created = sum(1 for result in results if 'order_id' in result)
+        body = {'results': results, 'created': created, 'failed': len(results) - created}
+        if created == len(results):
+            return jsonify(body), 201
+        return jsonify(body), 207 if created else 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to create orders'}), 500
+
 @orders_bp.route('/customer', methods=['GET'])
 @login_required
 def get_customer_orders(current_user):
@@ -37,12 +76,16 @@ def get_customer_orders(current_user):
             return jsonify({'error': 'Unauthorized'}), 403
 
         order_type = request.args.get('type', 'active')
-        orders = OrderService.get_customer_orders(
+        limit, cursor = get_page_params(request.args)
+        orders, next_cursor = OrderService.get_customer_orders(
             current_user['user_id'], 
-            order_type=order_type
+            order_type=order_type,
+            limit=limit,
+            cursor=cursor
         )
-        orders_json = json_util.dumps(orders)
-        return jsonify(json.loads(orders_json)), 200
+        return paginated_response(orders, next_cursor), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch orders'}), 500
 
@@ -55,8 +98,7 @@ def get_shop_orders(current_user):
 
         status = request.args.get('status')
         orders = OrderService.get_shop_orders(current_user['user_id'], status)
-        orders_json = json_util.dumps(orders)
-        return jsonify(json.loads(orders_json)), 200
+        return jsonify(orders), 200
     except Exception as e:
         return jsonify({'error': 'Failed to fetch orders'}), 500
 
@@ -73,7 +115,8 @@ def update_order_status(current_user, order_id):
             order_id=order_id,
             new_status=new_status,
             user_id=current_user['user_id'],
-            user_type=current_user['user_type']
+            user_type=current_user['user_type'],
+            shop_id=current_user.get('shop_id')
         )
         return jsonify({
             'message': 'Order status updated successfully',
@@ -1,25 +1,23 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app
 from app.services.shop_service import ShopService
 from app.services.order_service import OrderService
-from app.utils.decorators import login_required, shop_owner_required
-from bson import json_util, ObjectId
-import json
-from datetime import datetime, timedelta
+from app.services.order_state_machine import OrderNotFoundError
+from app.services.stats_service import ShopStatsService
+from app.services.route_service import RouteService
+from app.services.catalog_service import CatalogService
+from app.services.order_events import order_events
+from app.models.order import Order
+from app.utils.decorators import login_required, shop_owner_required, shop_context_required
+from app.utils.conditional import conditional_on
+from app.utils.pagination import get_page_params, keyset_stages, split_page
+import time
+from datetime import datetime
 from .. import db
 
 shop_bp = Blueprint('shop', __name__)
 
 # Order status configurations
-VALID_STATUSES = {
-    'pending', 'accepted', 'pickedUp', 'inProgress', 'completed', 'delivered', 'cancelled'
-}
-
-STATUS_GROUPS = {
-    'new': ['pending'],
-    'processing': ['accepted', 'pickedUp', 'inProgress'],
-    'ready': ['completed'],
-    'history': ['delivered', 'cancelled']
-}
+STATUS_GROUPS = Order.STATUS_GROUPS
 
 @shop_bp.route('/', methods=['POST'])
 @shop_owner_required
@@ -61,11 +59,11 @@ def get_nearby_shops(current_user):
 
 @shop_bp.route('/<shop_id>', methods=['GET'])
 @login_required
+@conditional_on('shops', lambda current_user, shop_id: shop_id, fields=('updated_at', 'total_orders'))
 def get_shop_details(current_user, shop_id):
     try:
         shop = ShopService.get_shop_details(shop_id)
-        shop_json = json_util.dumps(shop)
-        return jsonify(json.loads(shop_json)), 200
+        return jsonify(shop), 200
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
@@ -125,48 +123,54 @@ def update_shop_status(current_user, shop_id):
 @shop_bp.route('/', methods=['GET'])
 def get_all_shops():
     try:
-        # Fetch all active shops
-        shops = list(db.shops.find({"status": "active"}))
-        # Format the response
-        formatted_shops = [{
-            "id": str(shop["_id"]),
-            "name": shop["name"],
-            "rating": shop.get("rating", 4.5),  # Default rating if not available
-            "totalOrders": shop.get("total_orders", 0),
-            "distance": "1.2 km",  # Static for now
-            "services": shop.get("services", []),
-            "address": shop.get("address", "No address available")  
-        } for shop in shops]
-        return jsonify(formatted_shops), 200
+        snapshot = CatalogService.get_snapshot()
+
+        # Distances are per caller, so those responses are built on demand
+        if request.args.get('lat') and request.args.get('lng'):
+            lat = float(request.args.get('lat'))
+            lng = float(request.args.get('lng'))
+            return jsonify(CatalogService.with_distances(snapshot, lng, lat)), 200
+
+        gzipped = request.accept_encodings.quality('gzip') > 0
+        etag = snapshot.gzip_etag if gzipped else snapshot.etag
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        elif gzipped:
+            response = current_app.response_class(snapshot.gzip_body, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = current_app.response_class(snapshot.body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @shop_bp.route('/orders', methods=['GET'])
-@shop_owner_required
-def get_shop_orders(current_user):
+@shop_context_required
+def get_shop_orders(current_user, shop):
     try:
-        shop = db.shops.find_one({'owner_id': ObjectId(current_user['user_id'])})
-        if not shop:
-            return jsonify({'error': 'Shop not found'}), 404
-
         # Get filter type from query params
         filter_type = request.args.get('type', 'all')
         statuses = STATUS_GROUPS.get(filter_type, [])
+        limit, cursor = get_page_params(request.args)
 
         # Build match condition
         match_condition = {'shop_id': shop['_id']}
         if statuses:
             match_condition['status'] = {'$in': statuses}
 
-        orders = list(db.orders.aggregate([
-            {'$match': match_condition},
+        orders = list(db.orders.aggregate(keyset_stages(match_condition, limit, cursor) + [
             {'$lookup': {
                 'from': 'users',
                 'localField': 'customer_id',
                 'foreignField': '_id',
                 'as': 'customer'
             }},
-            {'$unwind': '$customer'},
+            {'$unwind': {'path': '$customer', 'preserveNullAndEmptyArrays': True}},
             {'$project': {
                 'id': {'$toString': '$_id'},
                 'customerName': '$customer.name',
@@ -177,31 +181,77 @@ def get_shop_orders(current_user):
                 'created_at': 1,
                 'pickup_address': 1,
                 'special_instructions': 1
-            }},
-            {'$sort': {'created_at': -1}}
+            }}
         ]))
+        orders, next_cursor = split_page(orders, limit)
 
-        # Get counts for different status groups
-        status_counts = {
-            'new': sum(1 for order in orders if order['status'] in STATUS_GROUPS['new']),
-            'processing': sum(1 for order in orders if order['status'] in STATUS_GROUPS['processing']),
-            'ready': sum(1 for order in orders if order['status'] in STATUS_GROUPS['ready']),
-            'history': sum(1 for order in orders if order['status'] in STATUS_GROUPS['history'])
-        }
+        # Get counts for different status groups from the shop's lane counters
+        status_counts = ShopStatsService.get_order_counters(shop['_id'])
 
         response = {
-            'orders': json.loads(json_util.dumps(orders)),
-            'counts': status_counts
+            'orders': orders,
+            'counts': status_counts,
+            'nextCursor': next_cursor
         }
 
         return jsonify(response), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error fetching orders: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@shop_bp.route('/pickups/route', methods=['GET'])
+@shop_context_required
+def get_pickup_route(current_user, shop):
+    try:
+        day = request.args.get('date')
+        if day:
+            try:
+                day = datetime.strptime(day, '%Y-%m-%d').date()
+            except ValueError:
+                raise ValueError('date must be YYYY-MM-DD')
+        return_to_shop = request.args.get('return', 'true').lower() != 'false'
+        route = RouteService.get_pickup_route(shop['_id'], day, return_to_shop)
+        return jsonify(route), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to plan pickup route'}), 500
+
+@shop_bp.route('/orders/stream', methods=['GET'])
+@shop_context_required(query_token=True)
+def stream_shop_orders(current_user, shop):
+    """Server-Sent Events feed of the shop's created and updated orders"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    heartbeat = current_app.config['ORDER_EVENTS_HEARTBEAT']
+    max_duration = current_app.config['ORDER_EVENTS_MAX_DURATION']
+
+    def stream():
+        # Subscribed inside the generator so the finally below always pairs with it
+        subscription, backlog = order_events.subscribe(shop['_id'], last_event_id)
+        try:
+            yield 'retry: 3000\n\n'
+            if backlog is None:
+                # Events were missed; the client should refetch the order list
+                yield 'event: reset\ndata: {}\n\n'
+            else:
+                yield from backlog
+            deadline = time.monotonic() + max_duration
+            while time.monotonic() < deadline and not subscription.overflowed:
+                message = subscription.get(timeout=heartbeat)
+                yield message if message else ': keepalive\n\n'
+        finally:
+            order_events.unsubscribe(subscription)
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @shop_bp.route('/orders/<order_id>/status', methods=['PUT'])
-@shop_owner_required
-def update_order_status(current_user, order_id):
+@shop_context_required
+def update_order_status(current_user, shop, order_id):
     try:
         data = request.get_json()
         new_status = data.get('status')
@@ -209,151 +259,42 @@ def update_order_status(current_user, order_id):
         if not new_status:
             return jsonify({'error': 'Status is required'}), 400
         
-        if new_status not in VALID_STATUSES:
-            return jsonify({'error': f'Invalid status. Must be one of: {", ".join(VALID_STATUSES)}'}), 400
-
-        shop = db.shops.find_one({'owner_id': ObjectId(current_user['user_id'])})
-        if not shop:
-            return jsonify({'error': 'Shop not found'}), 404
-
-        # Get current order
-        order = db.orders.find_one({
-            '_id': ObjectId(order_id),
-            'shop_id': shop['_id']
-        })
-
-        if not order:
-            return jsonify({'error': 'Order not found or unauthorized'}), 404
-
-        # Validate status transition
-        valid_transitions = {
-            'pending': ['accepted', 'cancelled'],
-            'accepted': ['pickedUp', 'cancelled'],
-            'pickedUp': ['inProgress', 'cancelled'],
-            'inProgress': ['completed', 'cancelled'],
-            'completed': ['delivered'],
-            'delivered': [],
-            'cancelled': []
-        }
-
-        current_status = order['status']
-        if new_status not in valid_transitions.get(current_status, []):
-            return jsonify({
-                'error': f'Invalid status transition from {current_status} to {new_status}'
-            }), 400
-
-        # Update order status
-        result = db.orders.update_one(
-            {
-                '_id': ObjectId(order_id),
-                'shop_id': shop['_id']
-            },
-            {
-                '$set': {
-                    'status': new_status,
-                    'updated_at': datetime.utcnow()
-                }
-            }
+        OrderService.update_order_status(
+            order_id=order_id,
+            new_status=new_status,
+            user_id=current_user['user_id'],
+            user_type='shopOwner',
+            shop_id=shop['_id']
         )
 
-        if result.modified_count == 0:
-            return jsonify({'error': 'Failed to update order status'}), 500
-
         return jsonify({
             'message': 'Order status updated successfully',
             'status': new_status
         }), 200
+    except OrderNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error updating order status: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @shop_bp.route('/dashboard-stats', methods=['GET'])
-@shop_owner_required
-def get_dashboard_stats(current_user):
+@shop_context_required
+def get_dashboard_stats(current_user, shop):
     try:
-        shop = db.shops.find_one({'owner_id': ObjectId(current_user['user_id'])})
-        if not shop:
-            return jsonify({'error': 'Shop not found'}), 404
-
         timeframe = request.args.get('timeframe', 'week')
-        
-        end_date = datetime.utcnow()
-        if timeframe == 'week':
-            start_date = end_date - timedelta(days=7)
-        elif timeframe == 'month':
-            start_date = end_date - timedelta(days=30)
-        else:  # year
-            start_date = end_date - timedelta(days=365)
-
-        # Get orders for the period
-        orders = list(db.orders.find({
-            'shop_id': shop['_id'],
-            'created_at': {'$gte': start_date, '$lte': end_date}
-        }).sort('created_at', -1))
-
-        # Calculate stats
-        stats = {
-            'overview': {
-                'totalOrders': len(orders),
-                'totalRevenue': sum(order.get('total_amount', 0) for order in orders),
-                'newOrders': sum(1 for order in orders if order['status'] in STATUS_GROUPS['new']),
-                'processingOrders': sum(1 for order in orders if order['status'] in STATUS_GROUPS['processing']),
-                'readyOrders': sum(1 for order in orders if order['status'] in STATUS_GROUPS['ready']),
-                'completedOrders': sum(1 for order in orders if order['status'] in STATUS_GROUPS['history'])
-            },
-            'revenueByDay': [],
-            'ordersByStatus': [],
-            'topServices': []
-        }
-
-        # Revenue by day
-        revenue_by_day = {}
-        for order in orders:
-            date = order['created_at'].strftime('%Y-%m-%d')
-            revenue_by_day[date] = revenue_by_day.get(date, 0) + order.get('total_amount', 0)
-
-        stats['revenueByDay'] = [
-            {'date': date, 'revenue': amount} 
-            for date, amount in sorted(revenue_by_day.items())
-        ]
-
-        # Orders by status
-        status_count = {}
-        for order in orders:
-            status = order.get('status', 'unknown')
-            status_count[status] = status_count.get(status, 0) + 1
-
-        stats['ordersByStatus'] = [
-            {'status': status, 'count': count}
-            for status, count in status_count.items()
-        ]
-
-        # Calculate top services
-        service_count = {}
-        for order in orders:
-            for item in order.get('items', []):
-                service = item.get('type')
-                if service:
-                    service_count[service] = service_count.get(service, 0) + item.get('count', 0)
-
-        stats['topServices'] = [
-            {'name': service, 'count': count}
-            for service, count in sorted(service_count.items(), key=lambda x: x[1], reverse=True)
-        ][:5]  # Top 5 services
-
+        stats = ShopService.get_dashboard_stats(shop['_id'], timeframe)
         return jsonify(stats), 200
     except Exception as e:
         print(f"Error in dashboard stats: {str(e)}")
         return jsonify({'error': 'Failed to fetch shop statistics'}), 500
 
 @shop_bp.route('/services', methods=['GET', 'POST'])
-@shop_owner_required
-def handle_services(current_user):
+@shop_context_required
+@conditional_on('shops', lambda current_user, shop: shop['_id'])
+def handle_services(current_user, shop):
     try:
-        shop = db.shops.find_one({'owner_id': ObjectId(current_user['user_id'])})
-        if not shop:
-            return jsonify({'error': 'Shop not found'}), 404
-
         if request.method == 'GET':
             services = ShopService.get_services(shop['_id'])
             return jsonify(services), 200
@@ -371,13 +312,9 @@ def handle_services(current_user):
         return jsonify({'error': 'Failed to handle service request'}), 500
 
 @shop_bp.route('/services/<service_id>', methods=['PUT', 'DELETE'])
-@shop_owner_required
-def handle_service(current_user, service_id):
+@shop_context_required
+def handle_service(current_user, shop, service_id):
     try:
-        shop = db.shops.find_one({'owner_id': ObjectId(current_user['user_id'])})
-        if not shop:
-            return jsonify({'error': 'Shop not found'}), 404
-
         if request.method == 'PUT':
             service_data = request.get_json()
             ShopService.update_service(
@@ -3,6 +3,7 @@
 from flask import Blueprint, request, jsonify
 from app.services.support_service import SupportService
 from app.utils.decorators import login_required
+from app.utils.pagination import get_page_params, paginated_response
 from app.models.supoort_ticket import SupportTicket  # Add this import
 from bson import json_util, ObjectId
 import json
@@ -56,10 +57,15 @@ def create_ticket(current_user):
 @login_required
 def get_user_tickets(current_user):
     try:
-        tickets = SupportService.get_user_tickets(current_user['user_id'])
+        limit, cursor = get_page_params(request.args)
+        tickets, next_cursor = SupportService.get_user_tickets(
+            current_user['user_id'], limit=limit, cursor=cursor
+        )
         # Convert tickets to dictionary format
         tickets_dict = [ticket.to_dict() for ticket in tickets]
-        return jsonify(tickets_dict), 200
+        return paginated_response(tickets_dict, next_cursor), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch tickets'}), 500
 
@@ -1,45 +1,127 @@
 import jwt
 import bcrypt
+import hashlib
 import logging
+import uuid
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
 from flask import current_app
 from .. import db
+from ..utils.bcrypt_pool import bcrypt_pool, PoolSaturatedError
+from ..utils.cache import ExpiringLRUCache
+from .revocation_service import RevocationService
+from .geocoding_service import geocoding_worker
+from ..utils.rate_limiter import login_throttle
 from ..utils.helpers import validate_email, validate_password, validate_phone
 
 logger = logging.getLogger(__name__)
 
 class AuthService:
+    # Verified principals keyed by token digest, evicted at the token's exp
+    token_cache = ExpiringLRUCache(maxsize=10000, name='verified_tokens')
+
     @staticmethod
-    def generate_token(user_id, user_type):
+    def generate_token(user_id, user_type, shop_id=None):
         """Generate JWT token for authenticated user"""
         payload = {
             'user_id': str(user_id),
             'user_type': user_type,
+            'jti': uuid.uuid4().hex,
             'exp': datetime.utcnow() + timedelta(days=1)
         }
+        if shop_id:
+            # Lets shop routes resolve the caller's shop without a lookup
+            payload['shop_id'] = str(shop_id)
         return jwt.encode(payload, current_app.config['JWT_SECRET_KEY'], algorithm='HS256')
 
     @staticmethod
-    def verify_token(token):
-        """Verify JWT token"""
+    def token_digest(token):
+        """Cache key for a token, so raw tokens are never held in memory as keys"""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def verify_token(cls, token):
+        """Verify JWT token, serving repeat tokens from the principal cache"""
+        key = cls.token_digest(token)
+        payload = cls.token_cache.get(key)
+        if payload is None:
+            try:
+                payload = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+            except jwt.ExpiredSignatureError:
+                raise Exception('Token has expired')
+            except jwt.InvalidTokenError:
+                raise Exception('Invalid token')
+            cls.token_cache.set(key, payload, expires_at=payload.get('exp'))
+        if RevocationService.is_revoked(payload.get('jti') or key):
+            cls.token_cache.pop(key)
+            raise Exception('Token has been revoked')
+        return dict(payload)
+
+    @classmethod
+    def blacklist_token(cls, token):
+        """Revoke a token until its own expiry.
+
+        Returns False for a token that has already expired, since it can no
+        longer be used anyway; raises ValueError for one that never was valid.
+        """
+        key = cls.token_digest(token)
         try:
             payload = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-            return payload
         except jwt.ExpiredSignatureError:
-            raise Exception('Token has expired')
+            cls.token_cache.pop(key)
+            return False
         except jwt.InvalidTokenError:
-            raise Exception('Invalid token')
+            raise ValueError('Invalid token')
+        if payload.get('exp'):
+            expires_at = datetime.utcfromtimestamp(payload['exp'])
+        else:
+            expires_at = datetime.utcnow() + timedelta(seconds=current_app.config['JWT_ACCESS_TOKEN_EXPIRES'])
+        # Tokens issued before jti was added are revoked by digest
+        RevocationService.revoke(payload.get('jti') or key, expires_at)
+        cls.token_cache.pop(key)
+        return True
 
     @staticmethod
     def hash_password(password):
-        """Hash password using bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        """Hash password using bcrypt on the bounded bcrypt pool"""
+        salt = bcrypt.gensalt(rounds=bcrypt_pool.rounds)
+        return bcrypt_pool.run(bcrypt.hashpw, password.encode('utf-8'), salt)
 
     @staticmethod
     def check_password(password, hashed):
-        """Verify password against hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed)
+        """Verify password against hash on the bounded bcrypt pool"""
+        return bcrypt_pool.run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    @staticmethod
+    def needs_rehash(hashed):
+        """True when a stored hash uses a lower work factor than configured"""
+        try:
+            return int(hashed.split(b'$')[2]) < bcrypt_pool.rounds
+        except (IndexError, ValueError):
+            return False
+
+    @staticmethod
+    def rehash_password(user_id, password, old_hash):
+        """Upgrade a user's hash to the current work factor in the background.
+
+        Skipped when the pool is busy; the next login will try again.
+        """
+        salt = bcrypt.gensalt(rounds=bcrypt_pool.rounds)
+        try:
+            future = bcrypt_pool.submit(bcrypt.hashpw, password.encode('utf-8'), salt)
+        except PoolSaturatedError:
+            return
+
+        def store(done):
+            try:
+                db.users.update_one(
+                    {'_id': user_id, 'password_hash': old_hash},
+                    {'$set': {'password_hash': done.result()}}
+                )
+            except Exception as e:
+                logger.error(f"Error rehashing password: {str(e)}")
+
+        future.add_done_callback(store)
 
     @classmethod
     def register_customer(cls, name, email, phone, password):
@@ -167,7 +249,7 @@ class AuthService:
                 },
                 'location': {
                     'type': 'Point',
-                    'coordinates': [0, 0]  # Will be updated later with geocoding
+                    'coordinates': [0, 0]  # Filled in by GeocodingService
                 },
                 'created_at': datetime.utcnow(),
                 'updated_at': datetime.utcnow()
@@ -175,9 +257,10 @@ class AuthService:
 
             # Insert shop
             shop_result = db.shops.insert_one(shop)
+            geocoding_worker.wake()
 
             # Generate token
-            token = cls.generate_token(user_id, 'shopOwner')
+            token = cls.generate_token(user_id, 'shopOwner', shop_result.inserted_id)
 
             return {
                 'token': token,
@@ -190,7 +273,7 @@ class AuthService:
                 }
             }
 
-        except ValueError as e:
+        except (ValueError, PoolSaturatedError) as e:
             logger.error(f"Validation error in register_shop_owner: {str(e)}")
             # Rollback if user was created but shop creation failed
             if 'user_id' in locals():
@@ -203,28 +286,38 @@ class AuthService:
             raise ValueError(f'Shop registration failed: {str(e)}')
 
     @classmethod
-    def login_user(cls, email, password):
+    def login_user(cls, email, password, client_ip=None):
         """Login user with email and password"""
         try:
+            # Refuse throttled callers before paying for the lookup and bcrypt
+            login_throttle.check(email, client_ip)
+
             user = db.users.find_one({'email': email})
             
-            if not user:
+            if not user or not cls.check_password(password, user['password_hash']):
+                login_throttle.record_failure(email, client_ip)
                 raise ValueError('Invalid email or password')
 
-            if not cls.check_password(password, user['password_hash']):
-                raise ValueError('Invalid email or password')
+            login_throttle.record_success(email)
+
+            if cls.needs_rehash(user['password_hash']):
+                cls.rehash_password(user['_id'], password, user['password_hash'])
 
             # Get shop details if user is shop owner
             shop_data = None
             if user['user_type'] == 'shopOwner':
-                shop = db.shops.find_one({'owner_id': user['_id']})
+                shop = db.shops.find_one({'owner_id': user['_id']}, {'name': 1})
                 if shop:
                     shop_data = {
                         'shop_id': str(shop['_id']),
                         'shop_name': shop['name']
                     }
 
-            token = cls.generate_token(user['_id'], user['user_type'])
+            token = cls.generate_token(
+                user['_id'],
+                user['user_type'],
+                shop_data['shop_id'] if shop_data else None
+            )
 
             response = {
                 'token': token,
@@ -269,7 +362,8 @@ class AuthService:
                 {
                     '$set': {
                         'reset_token': reset_token,
-                        'reset_token_exp': datetime.utcnow() + timedelta(hours=1)
+                        'reset_token_exp': datetime.utcnow() + timedelta(hours=1),
+                        'updated_at': datetime.utcnow()
                     }
                 }
             )
@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import logging
+import threading
+import time
+import numpy as np
+from flask import current_app
+from .. import db
+from app.utils.geo_index import GeoGridIndex
+from app.utils.helpers import haversine_many
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    """One immutable build of the public shop list"""
+
+    def __init__(self, version, items, coordinates, body):
+        self.version = version
+        self.items = items
+        # [lng, lat] per item, NaN where the shop has no usable location
+        self.coordinates = np.array(coordinates, dtype=float).reshape(-1, 2)
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        # Strong validators name one exact byte sequence, so each encoding has its own
+        self.gzip_etag = self.etag + '-gz'
+        self.built_at = time.monotonic()
+
+
+class CatalogService:
+    """Pre-serialized, pre-compressed catalog of active shops for GET /api/shop/.
+
+    The snapshot is rebuilt lazily on the first request after a ShopService
+    write in this process, or once ``ttl`` seconds have passed so writes made
+    by other workers show up too. Its ETag is a hash of the body, so every
+    worker serving the same catalog hands out the same validator.
+    """
+
+    ttl = 60
+
+    _snapshot = None
+    _stale = True
+    _version = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def invalidate(cls):
+        cls._stale = True
+
+    @staticmethod
+    def format_shop(shop):
+        return {
+            'id': str(shop['_id']),
+            'name': shop['name'],
+            'rating': shop.get('rating', 4.5),  # Default rating if not available
+            'totalOrders': shop.get('total_orders', 0),
+            'distance': None,
+            'services': shop.get('services', []),
+            'address': shop.get('address', 'No address available')
+        }
+
+    @classmethod
+    def build(cls):
+        shops = db.shops.find(
+            {'status': 'active'},
+            {'name': 1, 'rating': 1, 'total_orders': 1, 'services': 1, 'address': 1, 'location': 1}
+        )
+        items, coordinates = [], []
+        for shop in shops:
+            items.append(cls.format_shop(shop))
+            coords = GeoGridIndex.coordinates_of(shop)
+            coordinates.append(coords if coords and coords != (0.0, 0.0) else (np.nan, np.nan))
+        body = current_app.json.dumps(items).encode('utf-8')
+        cls._version += 1
+        return CatalogSnapshot(cls._version, items, coordinates, body)
+
+    @classmethod
+    def get_snapshot(cls):
+        snapshot = cls._snapshot
+        if snapshot and not cls._stale and time.monotonic() - snapshot.built_at < cls.ttl:
+            return snapshot
+        # One thread rebuilds; the others keep serving the previous build
+        if not cls._lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            if cls._snapshot is snapshot:
+                cls._stale = False
+                try:
+                    cls._snapshot = cls.build()
+                except Exception:
+                    cls._stale = True
+                    if snapshot is None:
+                        raise
+                    logger.exception('Error rebuilding shop catalog; serving the previous build')
+            return cls._snapshot
+        finally:
+            cls._lock.release()
+
+    @staticmethod
+    def with_distances(snapshot, lng, lat):
+        """Catalog items with ``distance`` filled in from (lng, lat)"""
+        distances = haversine_many((lng, lat), snapshot.coordinates) if len(snapshot.items) else []
+        items = []
+        for item, distance in zip(snapshot.items, distances):
+            item = dict(item)
+            item['distance'] = None if np.isnan(distance) else f'{distance:.1f} km'
+            items.append(item)
+        return items
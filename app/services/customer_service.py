@@ -1,8 +1,17 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
-from .. import db
+from .. import db, analytics_db
+from flask import current_app
+from app.utils.pagination import encode_cursor, keyset_stages, split_page
+from app.services.geocoding_service import geocoding_worker
 
 class CustomerService:
+    # Status mapping for order types
+    ORDER_TYPE_STATUSES = {
+        'active': ['pending', 'accepted', 'pickedUp', 'inProgress', 'completed'],
+        'history': ['delivered', 'cancelled']
+    }
+
     @staticmethod
     def get_profile(customer_id):
         customer = db.users.find_one(
@@ -48,8 +57,12 @@ class CustomerService:
 
         db.users.update_one(
             {'_id': ObjectId(customer_id)},
-            {'$push': {'addresses': address}}
+            {
+                '$push': {'addresses': address},
+                '$set': {'updated_at': datetime.utcnow()}
+            }
         )
+        geocoding_worker.wake()
         return str(address['_id'])
 
     @staticmethod
@@ -63,8 +76,11 @@ class CustomerService:
     @staticmethod
     def delete_address(customer_id, address_id):
         result = db.users.update_one(
-            {'_id': ObjectId(customer_id)},
-            {'$pull': {'addresses': {'_id': ObjectId(address_id)}}}
+            {'_id': ObjectId(customer_id), 'addresses._id': ObjectId(address_id)},
+            {
+                '$pull': {'addresses': {'_id': ObjectId(address_id)}},
+                '$set': {'updated_at': datetime.utcnow()}
+            }
         )
         if result.modified_count == 0:
             raise ValueError('Address not found')
@@ -72,7 +88,7 @@ class CustomerService:
 
     @staticmethod
     def get_order_history(customer_id):
-        orders = list(db.orders.aggregate([
+        orders = list(analytics_db.orders.aggregate([
             {'$match': {'customer_id': ObjectId(customer_id)}},
             {'$lookup': {
                 'from': 'shops',
@@ -94,13 +110,13 @@ class CustomerService:
         return orders
 
     @staticmethod
-    def get_order_by_status(current_user, order_type=None):
-            pipeline = [
-                {
-                    '$match': {
-                        'customer_id': ObjectId(current_user['user_id'])
-                    }
-                },
+    def get_order_by_status(current_user, order_type=None, limit=50, cursor=None):
+            """One page of the customer's orders, newest first; returns (orders, next_cursor)"""
+            match = {'customer_id': ObjectId(current_user['user_id'])}
+            if order_type in CustomerService.ORDER_TYPE_STATUSES:
+                match['status'] = {'$in': CustomerService.ORDER_TYPE_STATUSES[order_type]}
+
+            pipeline = keyset_stages(match, limit, cursor) + [
                 {
                     '$lookup': {
                         'from': 'shops',
@@ -110,10 +126,7 @@ class CustomerService:
                     }
                 },
                 {
-                    '$unwind': '$shop'
-                },
-                {
-                    '$sort': {'created_at': -1}
+                    '$unwind': {'path': '$shop', 'preserveNullAndEmptyArrays': True}
                 },
                 {
                     '$project': {
@@ -130,4 +143,64 @@ class CustomerService:
             ]
 
             orders = list(db.orders.aggregate(pipeline))
-            return orders
\ No newline at end of file
+            return split_page(orders, limit)
+
+    # Lowest possible _id, so a token built from a bare timestamp sorts first
+    MIN_OBJECT_ID = ObjectId('0' * 24)
+
+    @staticmethod
+    def sync_orders(customer_id, limit=100, since=None):
+        """Orders changed after ``since``, oldest change first; returns (orders, token, has_more).
+
+        ``since`` is a decoded (updated_at, _id) token from an earlier call, or
+        None for a full sync. Changes from the last ``ORDER_SYNC_LAG`` seconds
+        are held back for a later call, so no returned token, paged or final,
+        runs ahead of that window and writes landing slightly out of
+        timestamp order are still picked up.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['ORDER_SYNC_LAG'])
+        match = {'customer_id': ObjectId(customer_id), 'updated_at': {'$lte': cutoff}}
+        pipeline = keyset_stages(match, limit, since, field='updated_at', direction=1) + [
+            {
+                '$lookup': {
+                    'from': 'shops',
+                    'localField': 'shop_id',
+                    'foreignField': '_id',
+                    'as': 'shop'
+                }
+            },
+            {
+                '$unwind': {'path': '$shop', 'preserveNullAndEmptyArrays': True}
+            },
+            {
+                '$project': {
+                    'id': {'$toString': '$_id'},
+                    'shopName': '$shop.name',
+                    'items': 1,
+                    'status': 1,
+                    'pickup_date': 1,
+                    'total_amount': 1,
+                    'created_at': 1,
+                    'updated_at': 1,
+                    'pickup_address': 1
+                }
+            }
+        ]
+
+        orders = list(db.orders.aggregate(pipeline))
+        orders, next_token = split_page(orders, limit, field='updated_at')
+        if next_token:
+            return orders, next_token, True
+
+        # Everything up to the cutoff has been seen
+        last = since if since and since[0] >= cutoff else (cutoff, CustomerService.MIN_OBJECT_ID)
+        return orders, encode_cursor(*last), False
+
+    @staticmethod
+    def get_order_counts(customer_id):
+        """Number of the customer's orders per status"""
+        counts = db.orders.aggregate([
+            {'$match': {'customer_id': ObjectId(customer_id)}},
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+        ])
+        return {row['_id']: row['count'] for row in counts}
\ No newline at end of file
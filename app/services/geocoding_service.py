@@ -0,0 +1,244 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from pymongo import IndexModel, UpdateOne
+from .. import db
+from ..models.indexes import registry
+from ..utils.geocoders import build_geocoder, normalize_address
+
+logger = logging.getLogger(__name__)
+
+class GeocodingService:
+    """Fills in coordinates for shops and customer addresses that lack them.
+
+    Lookups go through ``geocode_cache`` first, keyed by the normalized
+    address and zip, so an address is sent to the backend once. Misses are
+    cached too, but expire after ``miss_ttl`` so they are retried later.
+    Shops still at ``[0, 0]`` and saved customer addresses without a
+    ``location`` are picked up in batches by ``run_batch``.
+    """
+
+    geocoder = None
+    batch_size = 50
+    retry_after = timedelta(hours=6)
+    miss_ttl = timedelta(days=7)
+
+    INDEXES = [
+        IndexModel([("expires_at", 1)], expireAfterSeconds=0)
+    ]
+
+    @classmethod
+    def init_app(cls, app):
+        cls.geocoder = build_geocoder(app.config)
+        cls.batch_size = app.config['GEOCODE_BATCH_SIZE']
+        cls.retry_after = timedelta(seconds=app.config['GEOCODE_RETRY_AFTER'])
+
+    @staticmethod
+    def point(coordinates):
+        return {'type': 'Point', 'coordinates': coordinates}
+
+    @staticmethod
+    def address_text(address):
+        """One-line query for a shop or customer address (string or dict)"""
+        if isinstance(address, dict):
+            parts = [address.get(field) for field in ('street', 'landmark', 'city', 'state')]
+            return ', '.join(str(part) for part in parts if part)
+        return address or ''
+
+    @classmethod
+    def geocode_many(cls, queries):
+        """Resolve {key: (address, zip_code)}; returns {key: [lng, lat] or None}"""
+        now = datetime.utcnow()
+        results = {
+            doc['_id']: doc.get('coordinates')
+            for doc in db.geocode_cache.find({'_id': {'$in': list(queries)}})
+        }
+        if cls.geocoder is None:
+            return results
+
+        writes = []
+        for key, (address, zip_code) in queries.items():
+            if key in results:
+                continue
+            try:
+                coordinates = cls.geocoder.geocode(address, zip_code)
+            except Exception as e:
+                # Leave the key uncached so the next batch tries again
+                logger.error(f"Geocoding failed for {key!r}: {str(e)}")
+                continue
+            results[key] = coordinates
+            entry = {'coordinates': coordinates, 'provider': cls.geocoder.name, 'created_at': now}
+            if coordinates is None:
+                entry['expires_at'] = now + cls.miss_ttl
+            writes.append(UpdateOne({'_id': key}, {'$set': entry}, upsert=True))
+        if writes:
+            db.geocode_cache.bulk_write(writes, ordered=False)
+        return results
+
+    @classmethod
+    def geocode(cls, address, zip_code=None):
+        key = normalize_address(address, zip_code)
+        return cls.geocode_many({key: (address, zip_code)}).get(key)
+
+    @classmethod
+    def _due(cls, now):
+        return {'$or': [
+            {'geocode_attempted_at': {'$exists': False}},
+            {'geocode_attempted_at': {'$lt': now - cls.retry_after}}
+        ]}
+
+    UNLOCATED_SHOP = {'$or': [
+        {'location.coordinates': [0, 0]},
+        {'location': {'$exists': False}}
+    ]}
+
+    @classmethod
+    def pending_shops(cls, now, limit):
+        return list(db.shops.find(
+            {'$and': [cls.UNLOCATED_SHOP, cls._due(now)]},
+            {'address': 1, 'zip_code': 1}
+        ).limit(limit))
+
+    @classmethod
+    def pending_addresses(cls, now, limit):
+        """[(user_id, address)] for saved addresses without a location"""
+        due = {'location': {'$exists': False}, **cls._due(now)}
+        pending = []
+        for user in db.users.find({'addresses': {'$elemMatch': due}}, {'addresses': 1}).limit(limit):
+            for address in user.get('addresses', []):
+                attempted = address.get('geocode_attempted_at')
+                if '_id' in address and 'location' not in address and (not attempted or attempted < now - cls.retry_after):
+                    pending.append((user['_id'], address))
+        return pending[:limit]
+
+    @staticmethod
+    def _query_key(queries, text, zip_code):
+        """Add a lookup to ``queries`` and return its key; None if there is nothing to look up"""
+        if not text and not zip_code:
+            return None
+        key = normalize_address(text, zip_code)
+        queries[key] = (text, zip_code)
+        return key
+
+    @classmethod
+    def run_batch(cls, limit=None):
+        """Geocode one batch of shops and addresses; returns what was done"""
+        limit = limit or cls.batch_size
+        now = datetime.utcnow()
+        shops = cls.pending_shops(now, limit)
+        addresses = cls.pending_addresses(now, limit)
+
+        queries = {}
+        shop_keys, address_keys = [], []
+        for shop in shops:
+            address = shop.get('address')
+            zip_code = shop.get('zip_code') or (address.get('pincode') if isinstance(address, dict) else None)
+            shop_keys.append(cls._query_key(queries, cls.address_text(address), zip_code))
+        for _, address in addresses:
+            address_keys.append(cls._query_key(queries, cls.address_text(address), address.get('pincode')))
+
+        results = cls.geocode_many(queries) if queries else {}
+
+        shop_writes = []
+        for shop, key in zip(shops, shop_keys):
+            coordinates = results.get(key)
+            update = {'geocode_attempted_at': now}
+            if coordinates:
+                update.update({'location': cls.point(coordinates), 'updated_at': now})
+            shop_writes.append(UpdateOne({'_id': shop['_id']}, {'$set': update}))
+
+        address_writes = []
+        for (user_id, address), key in zip(addresses, address_keys):
+            coordinates = results.get(key)
+            update = {'addresses.$.geocode_attempted_at': now}
+            if coordinates:
+                update.update({'addresses.$.location': cls.point(coordinates), 'updated_at': now})
+            address_writes.append(UpdateOne(
+                {'_id': user_id, 'addresses._id': address['_id']},
+                {'$set': update}
+            ))
+
+        if shop_writes:
+            db.shops.bulk_write(shop_writes, ordered=False)
+        if address_writes:
+            db.users.bulk_write(address_writes, ordered=False)
+
+        located_shops = sum(1 for key in shop_keys if results.get(key))
+        if located_shops:
+            from app.services.shop_service import ShopService
+            ShopService.shop_changed()
+        return {
+            'shops': len(shops),
+            'shops_located': located_shops,
+            'addresses': len(addresses),
+            'addresses_located': sum(1 for key in address_keys if results.get(key))
+        }
+
+    @classmethod
+    def pending_counts(cls):
+        now = datetime.utcnow()
+        return {
+            'shops': db.shops.count_documents(cls.UNLOCATED_SHOP),
+            'shops_due': db.shops.count_documents({'$and': [cls.UNLOCATED_SHOP, cls._due(now)]}),
+            'addresses': sum(
+                1 for user in db.users.find(
+                    {'addresses': {'$elemMatch': {'location': {'$exists': False}}}},
+                    {'addresses': 1}
+                )
+                for address in user.get('addresses', []) if 'location' not in address
+            ),
+            'cached': db.geocode_cache.estimated_document_count()
+        }
+
+
+class GeocodingWorker:
+    """Daemon thread that runs geocoding batches in the background.
+
+    It sleeps ``interval`` seconds between batches, runs again straight away
+    while a batch came back full, and can be woken early after a write that
+    adds something to geocode.
+    """
+
+    def __init__(self):
+        self.interval = 60
+        self.enabled = False
+        self.batches = 0
+        self.last_result = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.interval = app.config['GEOCODE_INTERVAL']
+        self.enabled = app.config['GEOCODE_WORKER_ENABLED'] and GeocodingService.geocoder is not None
+        if self.enabled:
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='geocoder', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        if self.enabled:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                self.last_result = GeocodingService.run_batch()
+                self.batches += 1
+                full = (self.last_result['shops'] >= GeocodingService.batch_size or
+                        self.last_result['addresses'] >= GeocodingService.batch_size)
+                if full:
+                    continue
+            except Exception as e:
+                logger.error(f"Geocoding batch failed: {str(e)}")
+            self._wake.wait(self.interval)
+
+
+geocoding_worker = GeocodingWorker()
+
+registry.register('geocode_cache', GeocodingService.INDEXES)
@@ -0,0 +1,242 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from pymongo.errors import OperationFailure, PyMongoError
+from .. import db
+from app.signals import order_created, order_status_changed
+from app.utils.cache import ExpiringLRUCache
+from app.utils.json_provider import bson_default
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One SSE connection's bounded queue of pre-formatted messages"""
+
+    def __init__(self, shop_id, maxsize):
+        self.shop_id = shop_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class OrderEventBroker:
+    """In-process pub/sub of order deltas, keyed by shop.
+
+    Events come from one of three sources (``ORDER_EVENTS_SOURCE``):
+
+    - ``local``: the order signals of this process. Cheapest, but a
+      subscriber only sees writes handled by the same worker.
+    - ``change_stream``: a MongoDB change stream on ``orders`` (replica
+      set required). Falls back to polling if the server refuses it.
+    - ``poll``: a thread reading orders by ``updated_at`` every
+      ``poll_interval`` seconds.
+
+    Each event is serialized once and fanned out to every subscriber of
+    the shop. A subscriber whose queue fills up is cut off and reconnects.
+    The last ``replay_size`` events per shop are kept so a reconnecting
+    client sending ``Last-Event-ID`` can catch up without a refetch. A
+    shop's buffer expires ``replay_ttl`` seconds after its last event, and
+    at most ``replay_shops`` buffers are kept; a client whose buffer is gone
+    is told to refetch.
+    """
+
+    SOURCES = ('local', 'change_stream', 'poll')
+    POLL_OVERLAP = timedelta(seconds=2)
+
+    def __init__(self):
+        self.source = 'local'
+        self.queue_size = 100
+        self.replay_size = 200
+        self.replay_ttl = 600
+        self.poll_interval = 2
+        self.published = 0
+        self.dropped = 0
+        self._instance = uuid.uuid4().hex[:8]
+        self._seq = itertools.count(1)
+        self._subscribers = {}  # shop_id -> set of Subscription
+        self._recent = ExpiringLRUCache(maxsize=1000, name='order_event_replay')  # shop_id -> deque of (seq, message)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.source = app.config['ORDER_EVENTS_SOURCE']
+        if self.source not in self.SOURCES:
+            raise ValueError(f'Unknown ORDER_EVENTS_SOURCE: {self.source}')
+        self.queue_size = app.config['ORDER_EVENTS_QUEUE_SIZE']
+        self.poll_interval = app.config['ORDER_EVENTS_POLL_INTERVAL']
+        self.replay_ttl = app.config['ORDER_EVENTS_REPLAY_TTL']
+        self._recent.maxsize = app.config['ORDER_EVENTS_REPLAY_SHOPS']
+
+    # Subscribers
+
+    def subscribe(self, shop_id, last_event_id=None):
+        """Register a subscriber; returns (subscription, backlog or None if a refetch is needed)"""
+        self._ensure_source()
+        subscription = Subscription(shop_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(shop_id, set()).add(subscription)
+            backlog = self._replay(shop_id, last_event_id) if last_event_id else []
+        return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.shop_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.shop_id]
+
+    def has_subscribers(self, shop_id):
+        return shop_id in self._subscribers
+
+    def _replay(self, shop_id, last_event_id):
+        instance, _, seq = last_event_id.partition('-')
+        recent = self._recent.get(shop_id)
+        if recent is None:
+            return None
+        if instance != self._instance or not seq.isdigit():
+            return None
+        seq = int(seq)
+        missed = [message for event_seq, message in recent if event_seq > seq]
+        # A gap between what the client saw and what is still buffered
+        if recent and recent[0][0] > seq + 1:
+            return None
+        return missed
+
+    # Publishing
+
+    @staticmethod
+    def format_message(event_id, event_type, payload):
+        data = json.dumps(payload, default=bson_default, separators=(',', ':'))
+        return f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
+
+    def publish(self, shop_id, event_type, payload):
+        with self._lock:
+            seq = next(self._seq)
+            message = self.format_message(f'{self._instance}-{seq}', event_type, payload)
+            recent = self._recent.get(shop_id)
+            if recent is None:
+                recent = deque(maxlen=self.replay_size)
+            self._recent.set(shop_id, recent, time.time() + self.replay_ttl)
+            recent.append((seq, message))
+            subscribers = list(self._subscribers.get(shop_id, ()))
+            self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.overflowed = True
+                self.dropped += 1
+
+    @staticmethod
+    def order_delta(order):
+        return {
+            'id': str(order['_id']),
+            'status': order.get('status'),
+            'items': order.get('items'),
+            'pickup_date': order.get('pickup_date'),
+            'totalAmount': order.get('total_amount'),
+            'pickup_address': order.get('pickup_address'),
+            'special_instructions': order.get('special_instructions'),
+            'created_at': order.get('created_at'),
+            'updated_at': order.get('updated_at')
+        }
+
+    def publish_order(self, order, created=False):
+        shop_id = order['shop_id']
+        delta = self.order_delta(order)
+        if created and self.has_subscribers(shop_id):
+            customer = db.users.find_one({'_id': order.get('customer_id')}, {'name': 1})
+            delta['customerName'] = customer.get('name') if customer else None
+        self.publish(shop_id, 'order.created' if created else 'order.updated', {'order': delta})
+
+    # Multi-worker sources
+
+    def _ensure_source(self):
+        if self.source == 'local' or (self._thread and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                target = self._watch if self.source == 'change_stream' else self._poll
+                self._thread = threading.Thread(target=target, name='order-events', daemon=True)
+                self._thread.start()
+
+    def _watch(self):
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace']}}}]
+        resume_token = None
+        while True:
+            try:
+                with db.orders.watch(pipeline, full_document='updateLookup',
+                                     resume_after=resume_token) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        order = change.get('fullDocument')
+                        if order and order.get('shop_id'):
+                            self.publish_order(order, created=change['operationType'] == 'insert')
+            except OperationFailure as e:
+                logger.error(f"Order change stream unavailable, polling instead: {str(e)}")
+                self.source = 'poll'
+                return self._poll()
+            except PyMongoError as e:
+                logger.error(f"Order change stream interrupted: {str(e)}")
+                time.sleep(1)
+
+    def _poll(self):
+        since = datetime.utcnow()
+        seen = {}  # (_id, updated_at) -> updated_at, for the overlap window
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                cursor = db.orders.find(
+                    {'updated_at': {'$gt': since - self.POLL_OVERLAP}}
+                ).sort('updated_at', 1).limit(1000)
+                for order in cursor:
+                    key = (order['_id'], order['updated_at'])
+                    if key in seen:
+                        continue
+                    seen[key] = order['updated_at']
+                    since = max(since, order['updated_at'])
+                    if order.get('shop_id'):
+                        self.publish_order(order, created=order.get('created_at') == order['updated_at'])
+                horizon = since - self.POLL_OVERLAP
+                seen = {key: ts for key, ts in seen.items() if ts > horizon}
+            except PyMongoError as e:
+                logger.error(f"Error polling order events: {str(e)}")
+
+    def stats(self):
+        return {
+            'source': self.source,
+            'shops': len(self._subscribers),
+            'subscribers': sum(len(subs) for subs in self._subscribers.values()),
+            'replay_shops': self._recent.stats()['size'],
+            'published': self.published,
+            'dropped': self.dropped
+        }
+
+
+order_events = OrderEventBroker()
+
+
+@order_created.connect
+def publish_created(sender, orders, **kwargs):
+    if order_events.source == 'local':
+        for order in orders:
+            order_events.publish_order(order, created=True)
+
+
+@order_status_changed.connect
+def publish_status_change(sender, order, new_status, changed_at, **kwargs):
+    if order_events.source == 'local':
+        order_events.publish_order(dict(order, status=new_status, updated_at=changed_at))
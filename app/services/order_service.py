@@ -1,96 +1,180 @@
+import logging
+from collections import Counter
 from datetime import datetime
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from .. import db
 from app.models.order import Order
+from app.utils.pagination import keyset_stages, split_page
+from app.services.shop_service import ShopService
+from app.services.stats_service import ShopStatsService
+from app.services.pricing_service import PricingService
+from app.services.order_state_machine import OrderStateMachine
+from app.signals import order_created
+
+logger = logging.getLogger(__name__)
 
 class OrderService:
-    VALID_STATUSES = [
-        'pending', 'accepted', 'pickedUp', 'inProgress', 
-        'completed', 'delivered', 'cancelled'
-    ]
-
-    STATUS_TRANSITIONS = {
-        'pending': ['accepted', 'cancelled'],
-        'accepted': ['pickedUp', 'cancelled'],
-        'pickedUp': ['inProgress', 'cancelled'],
-        'inProgress': ['completed', 'cancelled'],
-        'completed': ['delivered'],
-        'delivered': [],
-        'cancelled': []
-    }
+    BULK_REQUIRED_FIELDS = ['shop_id', 'items', 'pickup_date', 'pickup_address']
+
+    @staticmethod
+    def new_order(customer_id, shop_id, items, pickup_date,
+                  pickup_address, special_instructions=None, price_table=None):
+        """Order document with items and total priced from the shop's price table"""
+        items, total_amount = PricingService.price_items(price_table, items)
+        now = datetime.utcnow()
+        return {
+            'customer_id': ObjectId(customer_id),
+            'shop_id': ObjectId(shop_id),
+            'items': items,
+            'pickup_date': pickup_date,
+            'status': 'pending',
+            'status_history': [{'status': 'pending', 'changed_at': now}],
+            'total_amount': total_amount,
+            'pickup_address': pickup_address,
+            'special_instructions': special_instructions,
+            'created_at': now,
+            'updated_at': now
+        }
 
     @staticmethod
     def create_order(customer_id, shop_id, items, pickup_date, 
-                    pickup_address, special_instructions=None, total_amount=None):
+                    pickup_address, special_instructions=None):
         try:
-            shop = db.shops.find_one({'_id': ObjectId(shop_id)})
-            if not shop:
-                raise ValueError('Shop not found')
-
-            order = {
-                'customer_id': ObjectId(customer_id),
-                'shop_id': ObjectId(shop_id),
-                'items': items,
-                'pickup_date': pickup_date,
-                'status': 'pending',
-                'total_amount': total_amount,
-                'pickup_address': pickup_address,
-                'special_instructions': special_instructions,
-                'created_at': datetime.utcnow(),
-                'updated_at': datetime.utcnow()
-            }
+            # Also confirms the shop exists, from cache when warm
+            price_table = PricingService.get_table(shop_id)
+
+            order = OrderService.new_order(
+                customer_id, shop_id, items, pickup_date,
+                pickup_address, special_instructions, price_table
+            )
 
             result = db.orders.insert_one(order)
             db.shops.update_one(
             {'_id': ObjectId(shop_id)},
             {'$inc': {'total_orders': 1}}
         )
+            ShopStatsService.record_order_created(order)
+            order_created.send(OrderService, orders=[order])
             return str(result.inserted_id)
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Failed to create order: {str(e)}")
 
     
-    @staticmethod
-    def update_order_status(order_id, new_status, user_id, user_type):
-        if new_status not in OrderService.VALID_STATUSES:
-            raise ValueError(
-                f"Invalid status. Must be one of {', '.join(OrderService.VALID_STATUSES)}"
-            )
-
-        order = db.orders.find_one({'_id': ObjectId(order_id)})
-        if not order:
-            raise ValueError('Order not found')
-
-        current_status = order['status']
-        if new_status not in OrderService.STATUS_TRANSITIONS.get(current_status, []):
-            raise ValueError(f"Cannot transition from {current_status} to {new_status}")
+    @classmethod
+    def create_orders_bulk(cls, customer_id, entries):
+        """Create many orders in a handful of round trips.
+
+        Shops are checked with one $in query (for price tables not already
+        cached), items are priced server-side, orders go in through an
+        unordered insert_many and shop counters through one bulk_write.
+        Returns one result per entry, in input order: ``order_id`` on
+        success, ``error`` otherwise.
+        """
+        results = [None] * len(entries)
+        shop_ids = {}
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                results[index] = {'index': index, 'error': 'Order must be an object'}
+                continue
+            missing = [field for field in cls.BULK_REQUIRED_FIELDS if not entry.get(field)]
+            if missing:
+                results[index] = {'index': index, 'error': f"{', '.join(missing)} required"}
+                continue
+            try:
+                shop_ids[index] = ObjectId(entry['shop_id'])
+            except (InvalidId, TypeError):
+                results[index] = {'index': index, 'error': 'Invalid shop_id'}
+
+        # Cached price tables; the misses are fetched with one $in query
+        tables = PricingService.get_tables(shop_ids.values()) if shop_ids else {}
+
+        pending = []  # (input index, order document)
+        for index, shop_id in shop_ids.items():
+            table = tables.get(str(shop_id))
+            if table is None:
+                results[index] = {'index': index, 'error': 'Shop not found'}
+                continue
+            entry = entries[index]
+            try:
+                pending.append((index, cls.new_order(
+                    customer_id, shop_id, entry['items'], entry['pickup_date'],
+                    entry['pickup_address'], entry.get('special_instructions'), table
+                )))
+            except ValueError as e:
+                results[index] = {'index': index, 'error': str(e)}
+
+        failed = {}
+        if pending:
+            try:
+                db.orders.insert_many([order for _, order in pending], ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get('writeErrors', []):
+                    failed[error['index']] = error.get('errmsg', 'Insert failed')
+
+        inserted = []
+        for position, (index, order) in enumerate(pending):
+            if position in failed:
+                logger.error(f"Bulk order {index} failed: {failed[position]}")
+                results[index] = {'index': index, 'error': 'Failed to create order'}
+            else:
+                inserted.append(order)
+                results[index] = {'index': index, 'order_id': str(order['_id'])}
+
+        if inserted:
+            cls._after_bulk_insert(inserted)
+        return results
+
+    @classmethod
+    def _after_bulk_insert(cls, inserted):
+        """Shop totals, stats and notifications for orders that are already stored.
+
+        Failures here are logged, never raised: the orders exist, and an error
+        response would make the client retry and create duplicates.
+        """
+        per_shop = Counter(order['shop_id'] for order in inserted)
+        try:
+            db.shops.bulk_write([
+                UpdateOne({'_id': shop_id}, {'$inc': {'total_orders': count}})
+                for shop_id, count in per_shop.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Error updating shop order totals after bulk insert: {str(e)}")
+        try:
+            ShopStatsService.record_orders_created(inserted)
+        except Exception as e:
+            logger.error(f"Error recording bulk orders in shop stats, marking for reconcile: {str(e)}")
+            ShopStatsService.mark_for_reconcile(list(per_shop))
+        try:
+            order_created.send(cls, orders=inserted)
+        except Exception as e:
+            logger.error(f"Error notifying about bulk orders: {str(e)}")
 
-        # Verify authorization
+    @staticmethod
+    def update_order_status(order_id, new_status, user_id, user_type, shop_id=None):
         if user_type == 'customer':
-            if str(order['customer_id']) != user_id:
-                raise ValueError('Not authorized to update this order')
+            owner_filter = {'customer_id': ObjectId(user_id)}
         elif user_type == 'shopOwner':
-            shop = db.shops.find_one({'owner_id': ObjectId(user_id)})
-            if not shop or str(order['shop_id']) != str(shop['_id']):
+            owner_shop_id = ShopService.resolve_owner_shop_id(user_id, shop_id)
+            if not owner_shop_id:
                 raise ValueError('Not authorized to update this order')
+            owner_filter = {'shop_id': owner_shop_id}
+        else:
+            raise ValueError('Not authorized to update this order')
 
-        result = db.orders.update_one(
-            {'_id': ObjectId(order_id)},
-            {
-                '$set': {
-                    'status': new_status,
-                    'updated_at': datetime.utcnow()
-                }
-            }
+        OrderStateMachine.transition(
+            order_id, new_status, owner_filter,
+            actor={'user_id': user_id, 'user_type': user_type}
         )
-
-        if result.modified_count == 0:
-            raise ValueError('Failed to update order status')
-
         return True
 
     @staticmethod
-    def get_customer_orders(customer_id, order_type='active'):
+    def get_customer_orders(customer_id, order_type='active', limit=50, cursor=None):
+        """One page of the customer's orders, newest first; returns (orders, next_cursor)"""
         status_map = {
             'active': ['pending', 'accepted', 'pickedUp', 'inProgress', 'completed'],
             'history': ['delivered', 'cancelled']
@@ -98,13 +182,11 @@ class OrderService:
         
         statuses = status_map.get(order_type, status_map['active'])
         
-        pipeline = [
-            {
-                '$match': {
-                    'customer_id': ObjectId(customer_id),
-                    'status': {'$in': statuses}
-                }
-            },
+        match = {
+            'customer_id': ObjectId(customer_id),
+            'status': {'$in': statuses}
+        }
+        pipeline = keyset_stages(match, limit, cursor) + [
             {
                 '$lookup': {
                     'from': 'shops',
@@ -114,7 +196,7 @@ class OrderService:
                 }
             },
             {
-                '$unwind': '$shop'
+                '$unwind': {'path': '$shop', 'preserveNullAndEmptyArrays': True}
             },
             {
                 '$project': {
@@ -131,7 +213,7 @@ class OrderService:
         ]
 
         orders = list(db.orders.aggregate(pipeline))
-        return orders
+        return split_page(orders, limit)
 
     @staticmethod
     def get_order_details(order_id, user_id, user_type):
@@ -0,0 +1,67 @@
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from .. import db
+from app.models.order import Order
+from app.signals import order_status_changed
+
+
+class OrderNotFoundError(ValueError):
+    """Raised when the order does not exist or is not visible to the caller"""
+
+
+class OrderStateMachine:
+    """Applies order status transitions as single compare-and-set writes.
+
+    The update matches the order only if it belongs to the caller and is
+    in a status from which the target status is reachable, so concurrent
+    transitions cannot both apply from the same state. The same write
+    appends to ``status_history``; receivers of ``order_status_changed``
+    are notified afterwards.
+    """
+
+    @staticmethod
+    def sources_of(new_status):
+        """Statuses from which ``new_status`` can be reached"""
+        return [status for status, targets in Order.TRANSITIONS.items() if new_status in targets]
+
+    @classmethod
+    def transition(cls, order_id, new_status, owner_filter, actor):
+        """Move the order to ``new_status``; returns the order as it was before"""
+        if new_status not in Order.VALID_STATUSES:
+            raise ValueError(f"Invalid status. Must be one of {', '.join(Order.VALID_STATUSES)}")
+        try:
+            query = {'_id': ObjectId(order_id), **owner_filter}
+        except (InvalidId, TypeError):
+            raise OrderNotFoundError('Order not found')
+
+        now = datetime.utcnow()
+        order = db.orders.find_one_and_update(
+            {**query, 'status': {'$in': cls.sources_of(new_status)}},
+            {
+                '$set': {'status': new_status, 'updated_at': now},
+                '$push': {'status_history': {
+                    'status': new_status,
+                    'changed_at': now,
+                    'changed_by': actor
+                }}
+            },
+            return_document=ReturnDocument.BEFORE
+        )
+        if order is None:
+            # Only the failure path pays for a second read, to explain itself
+            current = db.orders.find_one(query, {'status': 1})
+            if current is None:
+                raise OrderNotFoundError('Order not found or unauthorized')
+            raise ValueError(f"Cannot transition from {current['status']} to {new_status}")
+
+        order_status_changed.send(
+            cls,
+            order=order,
+            old_status=order['status'],
+            new_status=new_status,
+            changed_at=now,
+            actor=actor
+        )
+        return order
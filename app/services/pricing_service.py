@@ -0,0 +1,96 @@
+import time
+from bson import ObjectId
+from bson.errors import InvalidId
+from .. import db
+from app.utils.cache import ExpiringLRUCache
+
+
+class PricingService:
+    """Prices orders from the shop's own ``services`` list.
+
+    Each shop's services are compiled once into a price table
+    ``{normalized type: (type, price)}`` kept in an in-process LRU cache.
+    Service edits drop the shop's table; ``ttl`` bounds how long edits made
+    by other workers can go unnoticed. A quote on a warm table needs no
+    database access.
+    """
+
+    price_tables = ExpiringLRUCache(maxsize=5000, name='price_tables')
+    ttl = 60
+
+    @staticmethod
+    def normalize_type(service_type):
+        return ' '.join(str(service_type).split()).lower()
+
+    @classmethod
+    def compile(cls, shop):
+        table = {}
+        for service in shop.get('services') or []:
+            if service.get('type') and isinstance(service.get('price'), (int, float)):
+                table[cls.normalize_type(service['type'])] = (service['type'], float(service['price']))
+        return table
+
+    @classmethod
+    def invalidate(cls, shop_id):
+        cls.price_tables.pop(str(shop_id))
+
+    @staticmethod
+    def _object_id(shop_id):
+        try:
+            return ObjectId(shop_id)
+        except (InvalidId, TypeError):
+            raise ValueError('Invalid shop_id')
+
+    @classmethod
+    def get_tables(cls, shop_ids):
+        """{shop_id string: price table} for the shops that exist; misses share one query"""
+        tables, missing = {}, []
+        for shop_id in {str(shop_id) for shop_id in shop_ids}:
+            table = cls.price_tables.get(shop_id)
+            if table is None:
+                missing.append(cls._object_id(shop_id))
+            else:
+                tables[shop_id] = table
+        if missing:
+            expires_at = time.time() + cls.ttl
+            for shop in db.shops.find({'_id': {'$in': missing}}, {'services': 1}):
+                table = cls.compile(shop)
+                cls.price_tables.set(str(shop['_id']), table, expires_at)
+                tables[str(shop['_id'])] = table
+        return tables
+
+    @classmethod
+    def get_table(cls, shop_id):
+        table = cls.get_tables([shop_id]).get(str(shop_id))
+        if table is None:
+            raise ValueError('Shop not found')
+        return table
+
+    @classmethod
+    def price_items(cls, table, items):
+        """Validate ``items`` against a price table; returns (priced items, total)"""
+        if not isinstance(items, list) or not items:
+            raise ValueError('items must be a non-empty list')
+        if not table:
+            raise ValueError('This shop has no services configured')
+
+        priced, total = [], 0.0
+        for item in items:
+            if not isinstance(item, dict) or not item.get('type'):
+                raise ValueError('Each item needs a type and a count')
+            count = item.get('count')
+            if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+                raise ValueError(f"Invalid count for {item['type']}")
+            entry = table.get(cls.normalize_type(item['type']))
+            if entry is None:
+                raise ValueError(f"Service not offered by this shop: {item['type']}")
+            service_type, price = entry
+            amount = round(price * count, 2)
+            priced.append({'type': service_type, 'count': count, 'unit_price': price, 'amount': amount})
+            total += amount
+        return priced, round(total, 2)
+
+    @classmethod
+    def quote(cls, shop_id, items):
+        priced, total = cls.price_items(cls.get_table(shop_id), items)
+        return {'shop_id': str(shop_id), 'items': priced, 'total_amount': total}
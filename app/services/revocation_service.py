@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from pymongo import IndexModel
+from .. import db
+from ..models.indexes import registry
+from ..utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+class RevocationService:
+    """Revoked token IDs, persisted in Mongo and mirrored in process.
+
+    ``revoked_tokens`` documents expire through a TTL index at the token's
+    own ``exp``. Each process keeps a Bloom filter plus an exact
+    ``{token_id: expires_at}`` map, pulled incrementally by ``revoked_at``
+    at most once per ``sync_interval`` seconds, so checking a token that was
+    never revoked costs no database round trip. Revocations made by other
+    workers become visible within one sync interval.
+    """
+
+    sync_interval = 5
+    bloom_capacity = 100000
+
+    _lock = threading.Lock()
+    _bloom = BloomFilter(capacity=bloom_capacity)
+    _revoked = {}
+    _last_revoked_at = None
+    _last_sync = 0.0
+
+    # Re-read a little before the newest revocation seen to tolerate
+    # clock skew between writers; duplicates are harmless.
+    SYNC_OVERLAP = timedelta(seconds=5)
+
+    INDEXES = [
+        IndexModel([("token_id", 1)], unique=True),
+        IndexModel([("revoked_at", 1)]),
+        IndexModel([("expires_at", 1)], expireAfterSeconds=0)
+    ]
+
+    @classmethod
+    def revoke(cls, token_id, expires_at):
+        """Persist a revocation and apply it to this process immediately"""
+        now = datetime.utcnow()
+        db.revoked_tokens.update_one(
+            {'token_id': token_id},
+            {'$setOnInsert': {
+                'token_id': token_id,
+                'revoked_at': now,
+                'expires_at': expires_at
+            }},
+            upsert=True
+        )
+        with cls._lock:
+            cls._remember(token_id, expires_at)
+
+    @classmethod
+    def is_revoked(cls, token_id):
+        if time.monotonic() - cls._last_sync >= cls.sync_interval:
+            cls.refresh()
+        if token_id not in cls._bloom:
+            return False
+        expires_at = cls._revoked.get(token_id)
+        return expires_at is not None and expires_at > datetime.utcnow()
+
+    @classmethod
+    def refresh(cls):
+        """Pull revocations recorded since the last sync"""
+        if not cls._lock.acquire(blocking=False):
+            return  # another thread is already syncing
+        try:
+            cls._last_sync = time.monotonic()
+            query = {}
+            if cls._last_revoked_at:
+                query['revoked_at'] = {'$gt': cls._last_revoked_at - cls.SYNC_OVERLAP}
+            cursor = db.revoked_tokens.find(
+                query,
+                {'_id': 0, 'token_id': 1, 'expires_at': 1, 'revoked_at': 1}
+            )
+            for doc in cursor:
+                cls._remember(doc['token_id'], doc['expires_at'])
+                if not cls._last_revoked_at or doc['revoked_at'] > cls._last_revoked_at:
+                    cls._last_revoked_at = doc['revoked_at']
+            cls._prune()
+        except Exception as e:
+            # Keep serving from the last known state rather than failing auth
+            logger.error(f"Error refreshing revoked tokens: {str(e)}")
+        finally:
+            cls._lock.release()
+
+    @classmethod
+    def _remember(cls, token_id, expires_at):
+        if token_id not in cls._revoked:
+            cls._bloom.add(token_id)
+        cls._revoked[token_id] = expires_at
+
+    @classmethod
+    def _prune(cls):
+        """Drop expired entries and rebuild the filter once half of it is stale"""
+        now = datetime.utcnow()
+        live = {tid: exp for tid, exp in cls._revoked.items() if exp > now}
+        if len(live) == len(cls._revoked):
+            return
+        cls._revoked = live
+        if cls._bloom.count > 2 * len(live) or len(live) > cls.bloom_capacity:
+            bloom = BloomFilter(capacity=max(cls.bloom_capacity, 2 * len(live)))
+            for token_id in live:
+                bloom.add(token_id)
+            cls._bloom = bloom
+
+registry.register('revoked_tokens', RevocationService.INDEXES)
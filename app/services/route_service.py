@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta
+import numpy as np
+from bson import ObjectId
+from flask import current_app
+from .. import db
+from app.utils.helpers import calculate_distance, distance_matrix
+
+class RouteService:
+    """Plans the order in which a shop collects its pickups.
+
+    The tour starts at the shop, visits every stop once and (by default)
+    returns to the shop. It is built greedily by nearest neighbour and
+    then improved with 2-opt moves evaluated a whole row at a time.
+    """
+
+    MAX_TWO_OPT_PASSES = 50
+
+    @staticmethod
+    def coordinates_of(address):
+        """[lng, lat] of a pickup address, or None if it carries no usable point"""
+        if not isinstance(address, dict):
+            return None
+        try:
+            if isinstance(address.get('location'), dict):
+                lng, lat = address['location']['coordinates'][:2]
+            elif address.get('coordinates'):
+                lng, lat = address['coordinates'][:2]
+            elif 'lat' in address and 'lng' in address:
+                lng, lat = address['lng'], address['lat']
+            elif 'latitude' in address and 'longitude' in address:
+                lng, lat = address['longitude'], address['latitude']
+            else:
+                return None
+            lng, lat = float(lng), float(lat)
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90) or (lng == 0 and lat == 0):
+            return None
+        return [lng, lat]
+
+    @staticmethod
+    def nearest_neighbour(matrix, start=0):
+        """Greedy tour over every node of ``matrix``, starting at ``start``"""
+        size = len(matrix)
+        visited = np.zeros(size, dtype=bool)
+        visited[start] = True
+        tour = [start]
+        current = start
+        for _ in range(size - 1):
+            row = np.where(visited, np.inf, matrix[current])
+            current = int(np.argmin(row))
+            visited[current] = True
+            tour.append(current)
+        return np.array(tour)
+
+    @classmethod
+    def two_opt(cls, matrix, tour):
+        """Improve a path whose first and last nodes stay fixed.
+
+        For each edge (a, b) every later edge (c, d) is scored in one
+        vectorized step, and the best improving segment reversal is applied.
+        """
+        tour = tour.copy()
+        size = len(tour)
+        for _ in range(cls.MAX_TWO_OPT_PASSES):
+            improved = False
+            for i in range(size - 3):
+                a, b = tour[i], tour[i + 1]
+                c, d = tour[i + 2:size - 1], tour[i + 3:size]
+                delta = matrix[a, c] + matrix[b, d] - matrix[a, b] - matrix[c, d]
+                k = int(np.argmin(delta))
+                if delta[k] < -1e-9:
+                    j = i + 2 + k
+                    tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1].copy()
+                    improved = True
+            if not improved:
+                break
+        return tour
+
+    @classmethod
+    def plan(cls, start, stops, return_to_start=True):
+        """Visiting order for ``stops`` ([lng, lat] each) from ``start``.
+
+        Returns (order, legs): indexes into ``stops`` and the km driven to
+        reach each of them. With ``return_to_start`` the closing leg back
+        to ``start`` is appended to ``legs``.
+        """
+        if not stops:
+            return [], []
+        points = np.vstack([np.asarray(start, dtype=float).reshape(1, 2),
+                            np.asarray(stops, dtype=float).reshape(-1, 2)])
+        matrix = distance_matrix(points)
+        size = len(points)
+        # Pin the path's end: back at the shop, or at a virtual node that
+        # is zero km from everywhere so the last stop is free
+        end = np.zeros((size + 1, size + 1))
+        end[:size, :size] = matrix
+        if return_to_start:
+            end[size, :size] = end[:size, size] = matrix[0]
+        tour = cls.nearest_neighbour(matrix)
+        tour = cls.two_opt(end, np.append(tour, size))
+
+        path = tour if return_to_start else tour[:-1]
+        legs = [float(end[path[i], path[i + 1]]) for i in range(len(path) - 1)]
+        return [int(node) - 1 for node in tour[1:-1]], legs
+
+    @staticmethod
+    def path_length(start, stops, return_to_start=True):
+        """Km driven visiting ``stops`` in the given order"""
+        if not stops:
+            return 0.0
+        points = [start] + list(stops) + ([start] if return_to_start else [])
+        return sum(calculate_distance(a, b) for a, b in zip(points, points[1:]))
+
+    @staticmethod
+    def pickups_for_day(shop_id, day):
+        """Accepted orders of the shop whose pickup falls on ``day`` (a date)"""
+        start = datetime(day.year, day.month, day.day)
+        return list(db.orders.find(
+            {
+                'shop_id': ObjectId(shop_id),
+                'status': 'accepted',
+                '$or': [
+                    {'pickup_date': {'$gte': start, '$lt': start + timedelta(days=1)}},
+                    {'pickup_date': {'$regex': f'^{day.isoformat()}'}}
+                ]
+            },
+            {'pickup_address': 1, 'pickup_date': 1, 'customer_id': 1, 'created_at': 1}
+        ).sort([('created_at', 1), ('_id', 1)]))
+
+    @classmethod
+    def get_pickup_route(cls, shop_id, day=None, return_to_shop=True):
+        shop = db.shops.find_one({'_id': ObjectId(shop_id)}, {'location': 1})
+        if not shop:
+            raise ValueError('Shop not found')
+        start = cls.coordinates_of(shop)
+        if not start:
+            raise ValueError('Shop location is not set')
+
+        day = day or datetime.utcnow().date()
+        orders = cls.pickups_for_day(shop_id, day)
+        max_stops = current_app.config['ROUTE_MAX_STOPS']
+        if len(orders) > max_stops:
+            raise ValueError(f'Too many pickups to route ({len(orders)}); the limit is {max_stops}')
+
+        routable, unrouted = [], []
+        for order in orders:
+            coords = cls.coordinates_of(order.get('pickup_address'))
+            (routable if coords else unrouted).append((order, coords))
+
+        stops = [coords for _, coords in routable]
+        visit, legs = cls.plan(start, stops, return_to_shop)
+
+        route, travelled = [], 0.0
+        for position, index in enumerate(visit):
+            order, coords = routable[index]
+            travelled += legs[position]
+            route.append({
+                'order_id': str(order['_id']),
+                'customer_id': str(order['customer_id']),
+                'pickup_address': order.get('pickup_address'),
+                'pickup_date': order.get('pickup_date'),
+                'location': coords,
+                'leg_distance': round(legs[position], 3),
+                'cumulative_distance': round(travelled, 3)
+            })
+
+        return {
+            'date': day.isoformat(),
+            'start': start,
+            'return_to_shop': return_to_shop,
+            'stops': route,
+            'unrouted': [
+                {'order_id': str(order['_id']), 'pickup_address': order.get('pickup_address')}
+                for order, _ in unrouted
+            ],
+            'total_distance': round(sum(legs), 3),
+            # Distance in booking order, for comparison
+            'unplanned_distance': round(cls.path_length(start, stops, return_to_shop), 3)
+        }
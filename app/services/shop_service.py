@@ -1,9 +1,55 @@
-from datetime import datetime
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
 from bson import ObjectId
-from .. import db
+from flask import current_app
+from .. import db, analytics_db
+from app.models.order import Order
+from app.services.stats_service import ShopStatsService
+from app.services.catalog_service import CatalogService
+from app.services.pricing_service import PricingService
+from app.utils.cache import ExpiringLRUCache
+from app.utils.geo_index import GeoGridIndex
 from app.utils.helpers import calculate_distance
 
+logger = logging.getLogger(__name__)
+
 class ShopService:
+    # owner_id -> shop ObjectId, for tokens issued before they carried shop_id
+    owner_shop_cache = ExpiringLRUCache(maxsize=10000, name='owner_shops')
+
+    # Active shops by location, refreshed incrementally by updated_at
+    geo_index = GeoGridIndex()
+    geo_refresh_interval = 30
+    geo_full_reload_interval = 600  # full reloads drop hard-deleted shops
+    _geo_lock = threading.Lock()
+    GEO_SYNC_OVERLAP = timedelta(seconds=5)
+
+    @classmethod
+    def shop_changed(cls, owner_id=None, shop_id=None):
+        """Invalidate per-process shop caches after a shop write"""
+        if owner_id:
+            cls.owner_shop_cache.pop(str(owner_id))
+        if shop_id:
+            PricingService.invalidate(shop_id)
+        cls.geo_index.last_refresh = 0.0
+        CatalogService.invalidate()
+
+    @classmethod
+    def resolve_owner_shop_id(cls, owner_id, token_shop_id=None):
+        """Return the ObjectId of the owner's shop, or None if they have none"""
+        if token_shop_id:
+            return ObjectId(token_shop_id)
+        shop_id = cls.owner_shop_cache.get(owner_id)
+        if shop_id is None:
+            shop = db.shops.find_one({'owner_id': ObjectId(owner_id)}, {'_id': 1})
+            if not shop:
+                return None
+            shop_id = shop['_id']
+            cls.owner_shop_cache.set(owner_id, shop_id)
+        return shop_id
+
     @staticmethod
     def create_shop(owner_id, shop_data):
         required_fields = ['name', 'address', 'location', 
@@ -27,6 +73,7 @@ class ShopService:
         }
 
         result = db.shops.insert_one(shop)
+        ShopService.shop_changed(owner_id)
         return str(result.inserted_id)
 
     @staticmethod
@@ -58,6 +105,7 @@ class ShopService:
             {'_id': ObjectId(shop_id)},
             {'$set': update_data}
         )
+        ShopService.shop_changed(owner_id, shop_id)
         return True
 
     @staticmethod
@@ -67,9 +115,58 @@ class ShopService:
             raise ValueError('Shop not found')
         return shop
 
-    @staticmethod
-    def get_nearby_shops(location, max_distance=5):
+    @classmethod
+    def refresh_geo_index(cls):
+        """Load the spatial index, then pull shops changed since the last pull.
+
+        Incremental pulls cannot see deleted documents, so the index is
+        reloaded in full every ``geo_full_reload_interval`` seconds.
+        """
+        index = cls.geo_index
+        now = time.monotonic()
+        if index.loaded and now - index.last_refresh < cls.geo_refresh_interval:
+            return
+        if not cls._geo_lock.acquire(blocking=False):
+            return  # another thread is refreshing; serve the current state
+        try:
+            index.last_refresh = now
+            full = not index.loaded or now - index.last_full_load >= cls.geo_full_reload_interval
+            if not full and index.last_updated_at:
+                query = {'updated_at': {'$gt': index.last_updated_at - cls.GEO_SYNC_OVERLAP}}
+            else:
+                query = {'status': 'active'}
+            docs = list(db.shops.find(query))
+            if full:
+                index.replace_all(docs)
+                index.last_full_load = now
+            else:
+                for doc in docs:
+                    index.upsert(doc)
+            for doc in docs:
+                if doc.get('updated_at') and (not index.last_updated_at or doc['updated_at'] > index.last_updated_at):
+                    index.last_updated_at = doc['updated_at']
+        finally:
+            cls._geo_lock.release()
+
+    @classmethod
+    def get_nearby_shops(cls, location, max_distance=5):
         """Find shops within the specified distance (in km)"""
+        if current_app.config['GEO_INDEX_ENABLED']:
+            try:
+                cls.refresh_geo_index()
+                if cls.geo_index.loaded:
+                    shops = []
+                    for distance, doc in cls.geo_index.query(location[0], location[1], max_distance):
+                        shop = dict(doc)
+                        shop['distance'] = distance
+                        shop['_id'] = str(shop['_id'])
+                        shop['owner_id'] = str(shop['owner_id'])
+                        shops.append(shop)
+                    return shops
+            except Exception as e:
+                logger.error(f"Spatial index query failed, falling back to $near: {str(e)}")
+            cls.geo_index.fallbacks += 1
+
         shops = list(db.shops.find({
             'status': 'active',
             'location': {
@@ -93,19 +190,32 @@ class ShopService:
 
         return shops
 
+    @staticmethod
+    def use_rollups():
+        """Rollups are read only when enabled and a full rebuild has populated them"""
+        return current_app.config['DASHBOARD_USE_ROLLUPS'] and ShopStatsService.rollups_ready()
+
     @staticmethod
     def get_shop_stats(shop_id):
         """Get shop statistics"""
-        pipeline = [
-            {'$match': {'shop_id': ObjectId(shop_id)}},
-            {'$group': {
-                '_id': '$status',
-                'count': {'$sum': 1},
-                'total_amount': {'$sum': '$total_amount'}
-            }}
-        ]
-        
-        stats = list(db.orders.aggregate(pipeline))
+        if ShopService.use_rollups():
+            days = analytics_db.shop_daily_stats.find(
+                {'shop_id': ObjectId(shop_id)},
+                {'status': 1, 'status_revenue': 1}
+            )
+        else:
+            # Shape raw per-status totals like a single rollup document
+            days = [{'status': {}, 'status_revenue': {}}]
+            for stat in analytics_db.orders.aggregate([
+                {'$match': {'shop_id': ObjectId(shop_id)}},
+                {'$group': {
+                    '_id': '$status',
+                    'count': {'$sum': 1},
+                    'total_amount': {'$sum': '$total_amount'}
+                }}
+            ]):
+                days[0]['status'][stat['_id']] = stat['count']
+                days[0]['status_revenue'][stat['_id']] = stat['total_amount']
         
         # Format stats
         formatted_stats = {
@@ -116,17 +226,153 @@ class ShopService:
             'pickup_dates': [] # Changed from pickup times
         }
         
-        for stat in stats:
-            if stat['_id'] == 'completed':
-                formatted_stats['completed_orders'] = stat['count']
-                formatted_stats['total_revenue'] = stat['total_amount']
-            elif stat['_id'] == 'pending':
-                formatted_stats['pending_orders'] = stat['count']
-            
-            formatted_stats['total_orders'] += stat['count']
+        for day in days:
+            status = day.get('status', {})
+            formatted_stats['completed_orders'] += status.get('completed', 0)
+            formatted_stats['pending_orders'] += status.get('pending', 0)
+            formatted_stats['total_revenue'] += day.get('status_revenue', {}).get('completed', 0)
+            formatted_stats['total_orders'] += sum(status.values())
             
         return formatted_stats
 
+    DASHBOARD_TIMEFRAMES = {'week': 7, 'month': 30, 'year': 365}
+
+    @staticmethod
+    def dashboard_pipeline(shop_id, start_date, end_date):
+        """Single $facet aggregation producing every dashboard section"""
+        def count_group(group):
+            return {'$sum': {'$cond': [{'$in': ['$status', Order.STATUS_GROUPS[group]]}, 1, 0]}}
+
+        return [
+            {'$match': {
+                'shop_id': ObjectId(shop_id),
+                'created_at': {'$gte': start_date, '$lte': end_date}
+            }},
+            {'$facet': {
+                'overview': [
+                    {'$group': {
+                        '_id': None,
+                        'totalOrders': {'$sum': 1},
+                        'totalRevenue': {'$sum': '$total_amount'},
+                        'newOrders': count_group('new'),
+                        'processingOrders': count_group('processing'),
+                        'readyOrders': count_group('ready'),
+                        'completedOrders': count_group('history')
+                    }},
+                    {'$project': {'_id': 0}}
+                ],
+                'revenueByDay': [
+                    {'$group': {
+                        '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
+                        'revenue': {'$sum': '$total_amount'}
+                    }},
+                    {'$sort': {'_id': 1}},
+                    {'$project': {'_id': 0, 'date': '$_id', 'revenue': 1}}
+                ],
+                'ordersByStatus': [
+                    {'$group': {
+                        '_id': {'$ifNull': ['$status', 'unknown']},
+                        'count': {'$sum': 1}
+                    }},
+                    {'$sort': {'count': -1, '_id': 1}},
+                    {'$project': {'_id': 0, 'status': '$_id', 'count': 1}}
+                ],
+                'topServices': [
+                    {'$unwind': '$items'},
+                    {'$match': {'items.type': {'$nin': [None, '']}}},
+                    {'$group': {
+                        '_id': '$items.type',
+                        'count': {'$sum': {'$ifNull': ['$items.count', 0]}}
+                    }},
+                    {'$sort': {'count': -1, '_id': 1}},
+                    {'$limit': 5},
+                    {'$project': {'_id': 0, 'name': '$_id', 'count': 1}}
+                ]
+            }}
+        ]
+
+    @staticmethod
+    def get_dashboard_stats(shop_id, timeframe='week'):
+        """Dashboard overview, daily revenue, status breakdown and top services"""
+        end_date = datetime.utcnow()
+        days = ShopService.DASHBOARD_TIMEFRAMES.get(timeframe, 365)
+        start_date = end_date - timedelta(days=days)
+
+        if ShopService.use_rollups():
+            return ShopService.dashboard_from_rollups(shop_id, start_date, end_date)
+        return ShopService.aggregate_dashboard_stats(shop_id, start_date, end_date)
+
+    @staticmethod
+    def dashboard_from_rollups(shop_id, start_date, end_date):
+        """Dashboard built from at most one shop_daily_stats document per day.
+
+        Rollups have day granularity, so the first day of the range is
+        counted in full.
+        """
+        days = ShopStatsService.get_daily_stats(shop_id, start_date, end_date)
+        status_count, service_count = {}, {}
+        revenue_by_day = []
+        total_revenue = 0
+        for day in days:
+            total_revenue += day.get('revenue', 0)
+            revenue_by_day.append({
+                'date': day['day'].strftime('%Y-%m-%d'),
+                'revenue': day.get('revenue', 0)
+            })
+            for status, count in day.get('status', {}).items():
+                status_count[status] = status_count.get(status, 0) + count
+            for key, count in day.get('services', {}).items():
+                name = ShopStatsService.decode_key(key)
+                service_count[name] = service_count.get(name, 0) + count
+
+        def group_total(group):
+            return sum(status_count.get(status, 0) for status in Order.STATUS_GROUPS[group])
+
+        return {
+            'overview': {
+                'totalOrders': sum(day.get('orders', 0) for day in days),
+                'totalRevenue': total_revenue,
+                'newOrders': group_total('new'),
+                'processingOrders': group_total('processing'),
+                'readyOrders': group_total('ready'),
+                'completedOrders': group_total('history')
+            },
+            'revenueByDay': revenue_by_day,
+            'ordersByStatus': [
+                {'status': status, 'count': count}
+                for status, count in sorted(status_count.items(), key=lambda x: (-x[1], x[0]))
+                if count > 0
+            ],
+            'topServices': [
+                {'name': service, 'count': count}
+                for service, count in sorted(service_count.items(), key=lambda x: (-x[1], x[0]))
+            ][:5]
+        }
+
+    @staticmethod
+    def aggregate_dashboard_stats(shop_id, start_date, end_date):
+        """Dashboard computed exactly from raw orders with one $facet pipeline"""
+        result = next(analytics_db.orders.aggregate(
+            ShopService.dashboard_pipeline(shop_id, start_date, end_date)
+        ))
+        overview = {
+            'totalOrders': 0,
+            'totalRevenue': 0,
+            'newOrders': 0,
+            'processingOrders': 0,
+            'readyOrders': 0,
+            'completedOrders': 0
+        }
+        if result['overview']:
+            overview.update(result['overview'][0])
+
+        return {
+            'overview': overview,
+            'revenueByDay': result['revenueByDay'],
+            'ordersByStatus': result['ordersByStatus'],
+            'topServices': result['topServices']
+        }
+
     @staticmethod
     def add_service(shop_id, owner_id, service_data):
         """Add a new service to the shop"""
@@ -157,6 +403,8 @@ class ShopService:
         if result.modified_count == 0:
             raise ValueError('Failed to add service')
 
+        ShopService.shop_changed(shop_id=shop_id)
+
         return service['id']
 
     @staticmethod
@@ -189,6 +437,7 @@ class ShopService:
         if result.modified_count == 0:
             raise ValueError('Service not found')
 
+        ShopService.shop_changed(shop_id=shop_id)
         return True
 
     @staticmethod
@@ -213,6 +462,7 @@ class ShopService:
         if result.modified_count == 0:
             raise ValueError('Service not found')
 
+        ShopService.shop_changed(shop_id=shop_id)
         return True
 
     @staticmethod
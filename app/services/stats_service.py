@@ -0,0 +1,390 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import IndexModel, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from .. import db, analytics_db
+from app.models.indexes import registry
+from app.models.order import Order
+from app.signals import order_status_changed
+
+logger = logging.getLogger(__name__)
+
+class ShopStatsService:
+    """Precomputed per-shop order statistics.
+
+    ``shop_daily_stats`` holds one document per (shop_id, day) with, for the
+    orders created that day, the order count, revenue, count and revenue per
+    current status, and item counts per service type.
+
+    ``shop_order_counters`` holds one document per shop (``_id`` is the
+    shop ID) with the number of orders currently in each board lane. A
+    shop's counters are trusted once reconciled against raw orders, which
+    happens on first read, so no manual step is needed after deploy.
+
+    Writers apply atomic ``$inc`` updates that also bump ``version``;
+    rebuild and reconcile repair any drift from raw orders.
+
+    Rollups only describe orders written while the writers were running, so
+    they are not read until a full ``rebuild`` has recorded its marker in
+    ``stats_meta``; until then dashboards fall back to raw orders.
+    """
+
+    INDEXES = [
+        IndexModel([("shop_id", 1), ("day", 1)], unique=True)
+    ]
+
+    ROLLUP_MARKER = 'shop_daily_stats'
+    ROLLUP_CHECK_INTERVAL = 60  # seconds between marker lookups while it is missing
+    # Orders written this close before a rebuild started are recomputed after it
+    CATCH_UP_SKEW = timedelta(seconds=5)
+    rollups_built = False
+    rollups_checked_at = 0
+
+    STATUS_TO_GROUP = {
+        status: group
+        for group, statuses in Order.STATUS_GROUPS.items()
+        for status in statuses
+    }
+
+    @staticmethod
+    def day_of(dt):
+        return datetime(dt.year, dt.month, dt.day)
+
+    @staticmethod
+    def encode_key(name):
+        """Make a service type safe to use as a field name (no dots, no leading $)"""
+        name = str(name).replace('.', '\uff0e')
+        return '\uff04' + name[1:] if name.startswith('$') else name
+
+    @staticmethod
+    def decode_key(key):
+        key = key.replace('\uff0e', '.')
+        return '$' + key[1:] if key.startswith('\uff04') else key
+
+    @staticmethod
+    def _amount(order):
+        amount = order.get('total_amount')
+        return amount if isinstance(amount, (int, float)) else 0
+
+    @classmethod
+    def created_update(cls, order):
+        """$inc document for a newly created order"""
+        amount = cls._amount(order)
+        inc = {
+            'orders': 1,
+            'revenue': amount,
+            f"status.{order['status']}": 1,
+            f"status_revenue.{order['status']}": amount
+        }
+        for item in order.get('items') or []:
+            if item.get('type') and isinstance(item.get('count'), (int, float)):
+                key = f"services.{cls.encode_key(item['type'])}"
+                inc[key] = inc.get(key, 0) + item['count']
+        return {'$inc': inc}
+
+    @classmethod
+    def record_order_created(cls, order):
+        cls.record_orders_created([order])
+
+    @classmethod
+    def record_orders_created(cls, orders):
+        """Apply new orders to rollups and lane counters, merged per shop and day"""
+        daily, lanes = {}, {}
+        for order in orders:
+            key = (order['shop_id'], cls.day_of(order['created_at']))
+            inc = daily.setdefault(key, {})
+            for field, value in cls.created_update(order)['$inc'].items():
+                inc[field] = inc.get(field, 0) + value
+            group = cls.STATUS_TO_GROUP.get(order['status'])
+            if group:
+                counts = lanes.setdefault(order['shop_id'], {})
+                counts[group] = counts.get(group, 0) + 1
+        # Lane counters must stay exact, so they are written first and on their own
+        if lanes:
+            cls._apply_counters(lanes)
+        try:
+            if daily:
+                db.shop_daily_stats.bulk_write([
+                    UpdateOne({'shop_id': shop_id, 'day': day}, {'$inc': inc}, upsert=True)
+                    for (shop_id, day), inc in daily.items()
+                ], ordered=False)
+        except Exception as e:
+            logger.error(f"Error recording orders in shop stats: {str(e)}")
+
+    @staticmethod
+    def _apply_counters(lanes):
+        """Apply ``{shop_id: {lane: delta}}``; shops whose update fails are marked for reconciling"""
+        try:
+            db.shop_order_counters.bulk_write([
+                UpdateOne({'_id': shop_id}, {'$inc': dict(counts, version=1)}, upsert=True)
+                for shop_id, counts in lanes.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Error updating order lane counters, marking for reconcile: {str(e)}")
+            ShopStatsService.mark_for_reconcile(list(lanes))
+
+    @staticmethod
+    def mark_for_reconcile(shop_ids):
+        """Make the next counter read for these shops reconcile from raw orders"""
+        try:
+            db.shop_order_counters.update_many(
+                {'_id': {'$in': shop_ids}},
+                {'$set': {'reconciled': False}}
+            )
+        except Exception as e:
+            logger.error(f"Error marking order lane counters for reconcile: {str(e)}")
+
+    @classmethod
+    def record_transition(cls, order, old_status, new_status):
+        amount = cls._amount(order)
+        old_group = cls.STATUS_TO_GROUP.get(old_status)
+        new_group = cls.STATUS_TO_GROUP.get(new_status)
+        if old_group != new_group:
+            inc = {}
+            if old_group:
+                inc[old_group] = -1
+            if new_group:
+                inc[new_group] = 1
+            cls._apply_counters({order['shop_id']: inc})
+        try:
+            db.shop_daily_stats.update_one(
+                {'shop_id': order['shop_id'], 'day': cls.day_of(order['created_at'])},
+                {'$inc': {
+                    f'status.{old_status}': -1,
+                    f'status.{new_status}': 1,
+                    f'status_revenue.{old_status}': -amount,
+                    f'status_revenue.{new_status}': amount
+                }}
+            )
+        except Exception as e:
+            logger.error(f"Error recording status change in shop stats: {str(e)}")
+
+    @classmethod
+    def get_order_counters(cls, shop_id):
+        """Orders per board lane, read from one document.
+
+        A shop whose counters were never reconciled (created before the
+        counters existed, or after a failed update) is reconciled first;
+        until a reconcile sticks, the counts come from raw orders.
+        """
+        doc = db.shop_order_counters.find_one({'_id': ObjectId(shop_id)}) or {}
+        if not doc.get('reconciled'):
+            drift = cls.reconcile_counters(shop_id)
+            if drift:
+                return drift[0]['actual']
+        return {group: doc.get(group, 0) for group in Order.STATUS_GROUPS}
+
+    @classmethod
+    def reconcile_counters(cls, shop_id=None, fix=True):
+        """Compare lane counters with raw orders; returns the shops that drifted.
+
+        Counters are read before the orders, and each fix is a compare-and-set
+        on the ``version`` that was read, so an ``$inc`` landing meanwhile
+        makes the fix a no-op instead of being overwritten. A shop with an
+        order written within ``CATCH_UP_SKEW`` of the read may have an
+        ``$inc`` still in flight, so it is reported as ``skipped`` and left
+        unreconciled for a later pass.
+        """
+        counter_match = {'_id': ObjectId(shop_id)} if shop_id else {}
+        stored = {doc.pop('_id'): doc for doc in db.shop_order_counters.find(counter_match)}
+        read_at = datetime.utcnow()
+
+        match = {'shop_id': ObjectId(shop_id)} if shop_id else {}
+        actual, last_write = {}, {}
+        for row in db.orders.aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': {'shop_id': '$shop_id', 'status': '$status'},
+                'count': {'$sum': 1},
+                'last_write': {'$max': '$updated_at'}
+            }}
+        ], allowDiskUse=True):
+            shop = row['_id']['shop_id']
+            if row['last_write'] and row['last_write'] > last_write.get(shop, datetime.min):
+                last_write[shop] = row['last_write']
+            group = cls.STATUS_TO_GROUP.get(row['_id']['status'])
+            if group:
+                counts = actual.setdefault(shop, dict.fromkeys(Order.STATUS_GROUPS, 0))
+                counts[group] += row['count']
+
+        drift, requests = [], []
+        shops = set(actual) | set(stored)
+        if shop_id:
+            shops.add(ObjectId(shop_id))
+        for shop in shops:
+            doc = stored.get(shop, {})
+            expected = actual.get(shop, dict.fromkeys(Order.STATUS_GROUPS, 0))
+            current = {group: doc.get(group, 0) for group in Order.STATUS_GROUPS}
+            busy = last_write.get(shop, datetime.min) > read_at - cls.CATCH_UP_SKEW
+            if current != expected:
+                drift.append({'shop_id': str(shop), 'stored': current, 'actual': expected, 'skipped': busy})
+            elif doc.get('reconciled'):
+                continue
+            if busy:
+                continue
+            # Matches only the version read above; a missing document is inserted
+            # only if no writer has created it since
+            guard = {'_id': shop, 'version': doc['version'] if 'version' in doc else {'$exists': False}}
+            requests.append(UpdateOne(
+                guard,
+                {'$set': dict(expected, reconciled=True), '$inc': {'version': 1}},
+                upsert=not doc
+            ))
+        if fix and requests:
+            try:
+                db.shop_order_counters.bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                # Duplicate keys: a writer created the document first; the next pass retries
+                logger.warning(f"Skipped {len(e.details.get('writeErrors', []))} counter reconcile(s) "
+                               f"raced by concurrent writes")
+        return drift
+
+    @classmethod
+    def rollups_ready(cls):
+        """True once a full rebuild has populated shop_daily_stats"""
+        if not cls.rollups_built and time.time() - cls.rollups_checked_at >= cls.ROLLUP_CHECK_INTERVAL:
+            cls.rollups_checked_at = time.time()
+            cls.rollups_built = db.stats_meta.find_one({'_id': cls.ROLLUP_MARKER}, {'_id': 1}) is not None
+        return cls.rollups_built
+
+    @classmethod
+    def get_daily_stats(cls, shop_id, start_date, end_date):
+        return list(analytics_db.shop_daily_stats.find(
+            {
+                'shop_id': ObjectId(shop_id),
+                'day': {'$gte': cls.day_of(start_date), '$lte': end_date}
+            },
+            {'_id': 0}
+        ).sort('day', 1))
+
+    @classmethod
+    def compute_rollups(cls, match):
+        """Rollup documents for the orders matching ``match``, keyed by (shop_id, day)"""
+        day = {'$dateFromString': {
+            'dateString': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}}
+        }}
+        docs = {}
+
+        def doc_for(key):
+            if key not in docs:
+                docs[key] = {
+                    'shop_id': key[0], 'day': key[1], 'orders': 0, 'revenue': 0,
+                    'status': {}, 'status_revenue': {}, 'services': {}
+                }
+            return docs[key]
+
+        by_status = db.orders.aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': {'shop_id': '$shop_id', 'day': day, 'status': '$status'},
+                'count': {'$sum': 1},
+                'revenue': {'$sum': '$total_amount'}
+            }}
+        ], allowDiskUse=True)
+        for row in by_status:
+            doc = doc_for((row['_id']['shop_id'], row['_id']['day']))
+            status = row['_id']['status'] or 'unknown'
+            doc['orders'] += row['count']
+            doc['revenue'] += row['revenue']
+            doc['status'][status] = row['count']
+            doc['status_revenue'][status] = row['revenue']
+
+        by_service = db.orders.aggregate([
+            {'$match': match},
+            {'$unwind': '$items'},
+            {'$match': {'items.type': {'$nin': [None, '']}}},
+            {'$group': {
+                '_id': {'shop_id': '$shop_id', 'day': day, 'type': '$items.type'},
+                'count': {'$sum': '$items.count'}
+            }}
+        ], allowDiskUse=True)
+        for row in by_service:
+            doc = doc_for((row['_id']['shop_id'], row['_id']['day']))
+            doc['services'][cls.encode_key(row['_id']['type'])] = row['count']
+        return docs
+
+    @staticmethod
+    def _replace_days(collection, docs):
+        requests = [
+            ReplaceOne({'shop_id': doc['shop_id'], 'day': doc['day']}, doc, upsert=True)
+            for doc in docs.values()
+        ]
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+
+    @classmethod
+    def rebuild(cls, shop_id=None):
+        """Recompute rollups from raw orders, for one shop or all of them.
+
+        A full rebuild is written to a staging collection and renamed over
+        ``shop_daily_stats``, so readers never see a half-built set. The
+        shop-days of orders written while it ran are then recomputed, since
+        their ``$inc`` updates went to the replaced collection. Finally the
+        marker that lets dashboards read rollups is recorded.
+        """
+        started = datetime.utcnow()
+        if shop_id:
+            match = {'shop_id': ObjectId(shop_id)}
+            docs = cls.compute_rollups(match)
+            cls._replace_days(db.shop_daily_stats, docs)
+            # Drop rollups for days that no longer have any orders
+            stale = [
+                existing['_id'] for existing in db.shop_daily_stats.find(match, {'shop_id': 1, 'day': 1})
+                if (existing['shop_id'], existing['day']) not in docs
+            ]
+            if stale:
+                db.shop_daily_stats.delete_many({'_id': {'$in': stale}})
+        else:
+            docs = cls.compute_rollups({})
+            staging = db.shop_daily_stats_rebuild
+            staging.drop()
+            staging.create_indexes(cls.INDEXES)
+            if docs:
+                staging.insert_many(list(docs.values()), ordered=False)
+                staging.rename('shop_daily_stats', dropTarget=True)
+            else:
+                db.shop_daily_stats.delete_many({})
+
+        cls.catch_up(started)
+        if not shop_id:
+            db.stats_meta.update_one(
+                {'_id': cls.ROLLUP_MARKER},
+                {'$set': {'rebuilt_at': started}},
+                upsert=True
+            )
+            cls.rollups_built = True
+        return len(docs)
+
+    @classmethod
+    def catch_up(cls, since, passes=3):
+        """Recompute the shop-days of orders written since ``since``"""
+        for _ in range(passes):
+            started = datetime.utcnow()
+            touched = {
+                (order['shop_id'], cls.day_of(order['created_at']))
+                for order in db.orders.find(
+                    {'updated_at': {'$gte': since - cls.CATCH_UP_SKEW}},
+                    {'shop_id': 1, 'created_at': 1}
+                )
+                if order.get('shop_id') and order.get('created_at')
+            }
+            if not touched:
+                return
+            docs = cls.compute_rollups({'$or': [
+                {'shop_id': shop, 'created_at': {'$gte': day, '$lt': day + timedelta(days=1)}}
+                for shop, day in touched
+            ]})
+            cls._replace_days(db.shop_daily_stats, docs)
+            for shop, day in touched - set(docs):
+                db.shop_daily_stats.delete_one({'shop_id': shop, 'day': day})
+            since = started
+
+
+@order_status_changed.connect
+def record_status_change(sender, order, old_status, new_status, **kwargs):
+    ShopStatsService.record_transition(order, old_status, new_status)
+
+
+registry.register('shop_daily_stats', ShopStatsService.INDEXES)
@@ -2,6 +2,7 @@ from app.models.supoort_ticket import SupportTicket
 from .. import db
 from bson import ObjectId
 from datetime import datetime
+from app.utils.pagination import keyset_filter, split_page
 
 class SupportService:
     @staticmethod
@@ -33,13 +34,17 @@ class SupportService:
             raise Exception(f'Failed to create ticket: {str(e)}')
 
     @staticmethod
-    def get_user_tickets(user_id):
-        """Get all tickets for a user."""
-        tickets = list(db.support_tickets.find(
-            {'user_id': user_id}
-        ).sort('created_at', -1))
+    def get_user_tickets(user_id, limit=50, cursor=None):
+        """Get one page of a user's tickets; returns (tickets, next_cursor)."""
+        query = {'user_id': user_id}
+        if cursor:
+            query.update(keyset_filter(cursor))
+        tickets = list(db.support_tickets.find(query).sort(
+            [('created_at', -1), ('_id', -1)]
+        ).limit(limit + 1))
+        tickets, next_cursor = split_page(tickets, limit)
         # Convert to SupportTicket objects
-        return [SupportTicket.from_dict(ticket) for ticket in tickets]
+        return [SupportTicket.from_dict(ticket) for ticket in tickets], next_cursor
 
     @staticmethod
     def get_ticket_details(user_id, ticket_id):
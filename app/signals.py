@@ -0,0 +1,11 @@
+from blinker import Namespace
+
+signals = Namespace()
+
+# Sent after an order's status changed, with ``order`` (the document as it
+# was before the write), ``old_status``, ``new_status``, ``changed_at`` and
+# ``actor`` ({'user_id', 'user_type'}).
+order_status_changed = signals.signal('order-status-changed')
+
+# Sent after orders were inserted, with ``orders`` (the new documents)
+order_created = signals.signal('order-created')
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the bcrypt queue is full; callers should answer 503"""
+
+
+class _Timing:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_seconds': self.total,
+            'avg_seconds': (self.total / self.count) if self.count else 0.0,
+            'max_seconds': self.max
+        }
+
+
+class BcryptPool:
+    """Dedicated, bounded executor for bcrypt work.
+
+    bcrypt releases the GIL, so a few worker threads hash in parallel while
+    request threads only wait on the result. At most ``max_queue`` jobs may
+    be pending or running; beyond that ``submit`` fails fast with
+    ``PoolSaturatedError`` instead of letting a login burst starve the
+    other endpoints.
+    """
+
+    def __init__(self, workers=None, max_queue=64, timeout=10, rounds=12):
+        self.workers = workers or os.cpu_count() or 2
+        self.rounds = rounds
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.rejected = 0
+        self.queue_wait = _Timing()
+        self.hash_time = _Timing()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def init_app(self, app):
+        self.workers = app.config['BCRYPT_POOL_SIZE'] or self.workers
+        self.max_queue = app.config['BCRYPT_MAX_QUEUE']
+        self.timeout = app.config['BCRYPT_TIMEOUT']
+        self.rounds = app.config['BCRYPT_ROUNDS']
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix='bcrypt'
+                    )
+        return self._executor
+
+    def submit(self, fn, *args):
+        """Queue ``fn(*args)``; returns a future or raises PoolSaturatedError"""
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self.rejected += 1
+                raise PoolSaturatedError('Authentication service is busy, please retry shortly')
+            self._pending += 1
+        queued_at = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._pending -= 1
+                    self.queue_wait.observe(started - queued_at)
+                    self.hash_time.observe(finished - started)
+
+        try:
+            return self._get_executor().submit(run)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def run(self, fn, *args):
+        """Run ``fn(*args)`` on the pool and wait for the result"""
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PoolSaturatedError('Authentication service timed out, please retry shortly')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'pending': self._pending,
+                'rejected': self.rejected,
+                'queue_wait': self.queue_wait.to_dict(),
+                'hash_time': self.hash_time.to_dict()
+            }
+
+
+bcrypt_pool = BcryptPool()
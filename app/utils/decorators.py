@@ -1,37 +1,69 @@
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, g
 from app.services.auth_service import AuthService
+from app.services.shop_service import ShopService
 
-def login_required(f):
+def authenticate(f, user_type=None, pass_user=True, query_token=False):
+    """Shared auth path for every protected route.
+
+    Verifies the bearer token, enforces the optional user type, stores the
+    principal on ``g.user`` and either passes it to the view or not. With
+    ``query_token`` the token may also come from ``?access_token=``, for
+    clients such as EventSource that cannot set headers.
+    """
     @wraps(f)
     def decorated_function(*args, **kwargs):
         auth_header = request.headers.get('Authorization')
+        if not auth_header and query_token and request.args.get('access_token'):
+            auth_header = f"Bearer {request.args['access_token']}"
         if not auth_header:
             return jsonify({'error': 'No authorization header'}), 401
-        
+
         try:
             token = auth_header.split(' ')[1]
             user = AuthService.verify_token(token)
-            return f(user, *args, **kwargs)
         except Exception as e:
             return jsonify({'error': str(e)}), 401
-            
+
+        if user_type and user['user_type'] != user_type:
+            return jsonify({'error': 'Shop owner access required'}), 403
+
+        g.user = user
+        if pass_user:
+            return f(user, *args, **kwargs)
+        return f(*args, **kwargs)
+
     return decorated_function
 
+def login_required(f):
+    return authenticate(f)
+
 def shop_owner_required(f):
+    return authenticate(f, user_type='shopOwner')
+
+def token_required(f):
+    """Verify JWT token and attach user to request context as ``g.user``"""
+    return authenticate(f, pass_user=False)
+
+def shop_context_required(f=None, query_token=False):
+    """Shop-owner route that also receives the caller's shop as ``shop``.
+
+    The shop ID comes from the token when present, otherwise from the
+    per-process owner cache, so handlers need no shop lookup of their own.
+    Use as ``@shop_context_required`` or ``@shop_context_required(query_token=True)``.
+    """
+    if f is None:
+        return lambda view: shop_context_required(view, query_token)
+
     @wraps(f)
-    def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({'error': 'No authorization header'}), 401
-        
-        try:
-            token = auth_header.split(' ')[1]
-            user = AuthService.verify_token(token)
-            if user['user_type'] != 'shopOwner':
-                return jsonify({'error': 'Shop owner access required'}), 403
-            return f(user, *args, **kwargs)
-        except Exception as e:
-            return jsonify({'error': str(e)}), 401
-            
-    return decorated_function
\ No newline at end of file
+    def with_shop(current_user, *args, **kwargs):
+        shop_id = ShopService.resolve_owner_shop_id(
+            current_user['user_id'],
+            current_user.get('shop_id')
+        )
+        if not shop_id:
+            return jsonify({'error': 'Shop not found'}), 404
+        g.shop_id = shop_id
+        return f(current_user, {'_id': shop_id}, *args, **kwargs)
+
+    return authenticate(with_shop, user_type='shopOwner', query_token=query_token)
@@ -0,0 +1,107 @@
+import math
+import threading
+import numpy as np
+from app.utils.helpers import haversine_many
+
+KM_PER_DEGREE_LAT = 111.32
+
+
+class GeoGridIndex:
+    """In-memory grid index of shop locations.
+
+    Shops are bucketed into fixed-size lat/lng cells. A radius query scans
+    only the cells overlapping the search box, then computes exact
+    distances for the candidates in one vectorized haversine pass.
+    """
+
+    def __init__(self, cell_size=0.05):
+        self.cell_size = cell_size  # degrees; 0.05 is ~5.5 km of latitude
+        self.loaded = False
+        self.last_updated_at = None
+        self.last_refresh = 0.0
+        self.last_full_load = 0.0
+        self.queries = 0
+        self.fallbacks = 0
+        self._shops = {}  # shop_id -> (lng, lat, doc)
+        self._cells = {}  # (x, y) -> set of shop_id
+        self._lock = threading.RLock()
+
+    def _cell(self, lng, lat):
+        return (math.floor(lng / self.cell_size), math.floor(lat / self.cell_size))
+
+    @staticmethod
+    def coordinates_of(doc):
+        try:
+            lng, lat = doc['location']['coordinates'][:2]
+            return float(lng), float(lat)
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def upsert(self, doc):
+        """Add or refresh a shop; inactive shops or ones without coordinates are dropped"""
+        shop_id = doc['_id']
+        with self._lock:
+            self.remove(shop_id)
+            coords = self.coordinates_of(doc)
+            if doc.get('status') != 'active' or coords is None:
+                return
+            self._shops[shop_id] = (coords[0], coords[1], doc)
+            self._cells.setdefault(self._cell(*coords), set()).add(shop_id)
+
+    def remove(self, shop_id):
+        with self._lock:
+            entry = self._shops.pop(shop_id, None)
+            if entry:
+                cell = self._cell(entry[0], entry[1])
+                members = self._cells.get(cell)
+                if members:
+                    members.discard(shop_id)
+                    if not members:
+                        del self._cells[cell]
+
+    def replace_all(self, docs):
+        with self._lock:
+            self._shops = {}
+            self._cells = {}
+            for doc in docs:
+                self.upsert(doc)
+            self.loaded = True
+
+    def _candidates(self, lng, lat, radius_km):
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        lng_span = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        x0, y0 = self._cell(lng - lng_span, max(lat - lat_span, -90))
+        x1, y1 = self._cell(lng + lng_span, min(lat + lat_span, 90))
+        if (x1 - x0 + 1) * (y1 - y0 + 1) >= len(self._cells):
+            return list(self._shops)
+        candidates = []
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                candidates.extend(self._cells.get((x, y), ()))
+        return candidates
+
+    def query(self, lng, lat, radius_km):
+        """Return [(distance_km, doc)] within radius, nearest first"""
+        with self._lock:
+            self.queries += 1
+            ids = self._candidates(lng, lat, radius_km)
+            if not ids:
+                return []
+            entries = [self._shops[shop_id] for shop_id in ids]
+        coords = np.array([(entry[0], entry[1]) for entry in entries])
+        distances = haversine_many((lng, lat), coords)
+        within = np.flatnonzero(distances <= radius_km)
+        order = within[np.argsort(distances[within], kind='stable')]
+        return [(float(distances[i]), entries[i][2]) for i in order]
+
+    def __len__(self):
+        return len(self._shops)
+
+    def stats(self):
+        return {
+            'shops': len(self._shops),
+            'cells': len(self._cells),
+            'loaded': self.loaded,
+            'queries': self.queries,
+            'fallbacks': self.fallbacks
+        }
@@ -0,0 +1,84 @@
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_address(address, zip_code=None):
+    """Cache key for an address: lowercase words and digits, plus the bare zip"""
+    text = ' '.join(re.findall(r'[a-z0-9]+', str(address or '').lower()))
+    zip_code = re.sub(r'\s+', '', str(zip_code or '')).lower()
+    return f'{text}|{zip_code}'
+
+
+class NominatimGeocoder:
+    """OpenStreetMap Nominatim through geopy, held to one request per ``min_delay``"""
+
+    name = 'nominatim'
+
+    def __init__(self, user_agent, timeout=10, min_delay=1.0, country_codes=None):
+        from geopy.extra.rate_limiter import RateLimiter
+        from geopy.geocoders import Nominatim
+        self._geocoder = Nominatim(user_agent=user_agent, timeout=timeout)
+        self._geocode = RateLimiter(self._geocoder.geocode, min_delay_seconds=min_delay,
+                                    max_retries=2, swallow_exceptions=False)
+        self.country_codes = country_codes
+
+    def geocode(self, address, zip_code=None):
+        """[lng, lat] for the address, or None if it could not be found"""
+        query = ', '.join(part for part in (address, zip_code) if part)
+        location = self._geocode(query, country_codes=self.country_codes)
+        if location is None and zip_code:
+            location = self._geocode({'postalcode': zip_code}, country_codes=self.country_codes)
+        if location is None:
+            return None
+        return [location.longitude, location.latitude]
+
+
+class StaticGeocoder:
+    """Local stand-in answering from a fixed table; never touches the network.
+
+    ``table`` maps address strings (optionally ``"address|zip"``) to
+    ``[lng, lat]``; zip-only entries (``"|zip"``) act as a fallback.
+    """
+
+    name = 'static'
+
+    def __init__(self, table=None):
+        self.table = {}
+        self.calls = 0
+        for key, coordinates in (table or {}).items():
+            address, _, zip_code = key.partition('|')
+            self.table[normalize_address(address, zip_code)] = list(coordinates)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as fh:
+            return cls(json.load(fh))
+
+    def geocode(self, address, zip_code=None):
+        self.calls += 1
+        for key in (normalize_address(address, zip_code), normalize_address(address),
+                    normalize_address('', zip_code)):
+            if key in self.table:
+                return self.table[key]
+        return None
+
+
+def build_geocoder(config):
+    """Geocoder backend named by ``GEOCODER_BACKEND``, or None when disabled"""
+    backend = config['GEOCODER_BACKEND']
+    if backend == 'nominatim':
+        return NominatimGeocoder(
+            user_agent=config['GEOCODER_USER_AGENT'],
+            timeout=config['GEOCODER_TIMEOUT'],
+            min_delay=config['GEOCODER_MIN_DELAY'],
+            country_codes=config['GEOCODER_COUNTRY_CODES']
+        )
+    if backend == 'static':
+        path = config['GEOCODER_STATIC_FILE']
+        return StaticGeocoder.from_file(path) if path else StaticGeocoder()
+    if backend in ('none', '', None):
+        return None
+    raise ValueError(f'Unknown geocoder backend: {backend}')
@@ -1,7 +1,10 @@
 from datetime import datetime
 from bson import ObjectId
+import numpy as np
 import re
 
+EARTH_RADIUS_KM = 6371
+
 def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return bool(re.match(pattern, email))
@@ -34,6 +37,31 @@ def calculate_distance(coord1, coord2):
 
     return distance
 
+def haversine_many(origin, coords):
+    """Distances in km from one [lng, lat] point to an (n, 2) array of [lng, lat] points"""
+    coords = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lon1, lat1 = np.radians(origin[0]), np.radians(origin[1])
+    dlat = coords[:, 1] - lat1
+    dlon = coords[:, 0] - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(coords[:, 1]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def distance_matrix(origins, destinations=None):
+    """Pairwise haversine distances in km between two lists of [lng, lat] points.
+
+    Returns an (n, m) array; with one argument, the (n, n) matrix of the
+    points against themselves.
+    """
+    origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    if destinations is None:
+        destinations = origins
+    else:
+        destinations = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+    lon1, lat1 = origins[:, 0:1], origins[:, 1:2]
+    lon2, lat2 = destinations[:, 0], destinations[:, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
 def format_datetime(dt):
     return datetime.strftime(dt, "%Y-%m-%d %H:%M:%S")
 
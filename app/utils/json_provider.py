@@ -0,0 +1,70 @@
+import base64
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId, json_util
+from bson.binary import Binary
+from bson.decimal128 import Decimal128
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional C encoder
+    orjson = None
+
+EPOCH = datetime(1970, 1, 1)
+
+def bson_default(obj):
+    """Encode BSON types exactly as ``json_util.dumps`` (relaxed mode) does"""
+    if isinstance(obj, ObjectId):
+        return {'$oid': str(obj)}
+    if isinstance(obj, datetime):
+        if obj.tzinfo is not None:
+            obj = obj.astimezone(timezone.utc).replace(tzinfo=None)
+        if obj >= EPOCH:
+            millis = obj.microsecond // 1000
+            fraction = f'.{millis:03d}' if millis else ''
+            return {'$date': f"{obj.strftime('%Y-%m-%dT%H:%M:%S')}{fraction}Z"}
+        return {'$date': {'$numberLong': str((obj - EPOCH) // timedelta(milliseconds=1))}}
+    if isinstance(obj, Decimal128):
+        return {'$numberDecimal': str(obj)}
+    if isinstance(obj, (bytes, Binary)):
+        subtype = getattr(obj, 'subtype', 0)
+        return {'$binary': {
+            'base64': base64.b64encode(obj).decode(),
+            'subType': f'{subtype:02x}'
+        }}
+    try:
+        return json_util.default(obj)
+    except (TypeError, ValueError):
+        return DefaultJSONProvider.default(obj)
+
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes Mongo documents in a single pass.
+
+    Output matches the old ``jsonify(json.loads(json_util.dumps(doc)))``
+    round trip. orjson is used for compact responses when installed.
+    """
+
+    default = staticmethod(bson_default)
+
+    def _use_orjson(self):
+        if orjson is None:
+            return False
+        return self.compact or (self.compact is None and not self._app.debug)
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs and self._use_orjson():
+            return self._orjson_dumps(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if not self._use_orjson():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._orjson_dumps(obj), mimetype=self.mimetype)
+
+    def _orjson_dumps(self, obj):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=bson_default, option=option)
@@ -0,0 +1,267 @@
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, request
+from pymongo.monitoring import CommandListener
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; one bisect and one locked update per observation"""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics owned by this process plus collectors that read other components' stats"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register ``fn() -> [(name, type, help, [(labels dict, value)])]``"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'Time spent handling requests.', ('endpoint', 'method'))
+http_requests = metrics.counter(
+    'http_requests_total', 'Requests handled, by status code.', ('endpoint', 'method', 'status'))
+mongo_command_duration = metrics.histogram(
+    'mongo_command_duration_seconds', 'MongoDB command round-trip time.', ('collection', 'command'))
+mongo_command_failures = metrics.counter(
+    'mongo_command_failures_total', 'MongoDB commands that returned an error.', ('collection', 'command'))
+
+
+class CommandMetrics(CommandListener):
+    """Times every MongoDB command by collection and command name.
+
+    Registered with the client before the app is configured, so it records
+    nothing until ``init_app`` turns metrics on.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._pending = {}  # (request_id, connection_id) -> (collection, command)
+
+    def started(self, event):
+        if not self.enabled:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            target = event.command.get('collection')
+        collection = target if isinstance(target, str) else ''
+        self._pending[(event.request_id, event.connection_id)] = (collection, event.command_name)
+
+    def succeeded(self, event):
+        labels = self._pending.pop((event.request_id, event.connection_id), None)
+        if labels:
+            mongo_command_duration.observe(event.duration_micros / 1e6, *labels)
+
+    def failed(self, event):
+        labels = self._pending.pop((event.request_id, event.connection_id), None)
+        if labels:
+            mongo_command_duration.observe(event.duration_micros / 1e6, *labels)
+            mongo_command_failures.inc(*labels)
+
+
+command_metrics = CommandMetrics()
+
+
+def cache_samples(caches):
+    stats = [cache.stats() for cache in caches]
+    return [
+        ('cache_hits_total', 'counter', 'Cache lookups that found a live entry.',
+         [({'cache': s['name']}, s['hits']) for s in stats]),
+        ('cache_misses_total', 'counter', 'Cache lookups that missed or found an expired entry.',
+         [({'cache': s['name']}, s['misses']) for s in stats]),
+        ('cache_hit_ratio', 'gauge', 'Hits over lookups since start.',
+         [({'cache': s['name']}, s['hit_ratio']) for s in stats]),
+        ('cache_entries', 'gauge', 'Entries currently held.',
+         [({'cache': s['name']}, s['size']) for s in stats]),
+    ]
+
+
+@metrics.collector
+def component_samples():
+    """Caches, pools and background components that keep their own counters"""
+    from app.services.auth_service import AuthService
+    from app.services.order_events import order_events
+    from app.services.pricing_service import PricingService
+    from app.services.shop_service import ShopService
+    from app.utils.bcrypt_pool import bcrypt_pool
+    from app.utils.conditional import body_etags
+    from app.utils.mongo_pool import pool_monitor
+    from app.utils.rate_limiter import login_throttle
+
+    samples = cache_samples([AuthService.token_cache, ShopService.owner_shop_cache,
+                             PricingService.price_tables, body_etags])
+
+    pool = pool_monitor.stats()
+    quantiles = [({'quantile': q}, pool[f'wait_ms_p{int(float(q) * 100)}'] / 1000) for q in ('0.5', '0.95', '0.99')]
+    samples += [
+        # Percentiles of a sliding window, not a Prometheus summary: no _sum/_count to go with them
+        ('mongo_pool_checkout_wait_seconds', 'gauge',
+         'Percentiles of time spent waiting for a pooled connection (recent window).',
+         quantiles),
+        ('mongo_pool_checkouts_total', 'counter', 'Connections checked out of the pool.',
+         [({}, pool['checkouts'])]),
+        ('mongo_pool_checkout_failures_total', 'counter', 'Failed connection checkouts.',
+         [({}, pool['failures'])]),
+        ('mongo_pool_open_connections', 'gauge', 'Connections currently open.',
+         [({}, pool['open_connections'])]),
+    ]
+
+    bcrypt = bcrypt_pool.stats()
+    samples += [
+        ('bcrypt_pending', 'gauge', 'bcrypt jobs queued or running.', [({}, bcrypt['pending'])]),
+        ('bcrypt_rejected_total', 'counter', 'bcrypt jobs refused because the queue was full.',
+         [({}, bcrypt['rejected'])]),
+    ]
+
+    throttle = login_throttle.stats()
+    samples.append(('login_throttled_total', 'counter', 'Login attempts refused by the throttle.',
+                    [({}, throttle['throttled'])]))
+
+    geo = ShopService.geo_index.stats()
+    samples += [
+        ('geo_index_shops', 'gauge', 'Shops held in the nearby-search index.', [({}, geo['shops'])]),
+        ('geo_index_queries_total', 'counter', 'Nearby searches answered by the index.', [({}, geo['queries'])]),
+        ('geo_index_fallbacks_total', 'counter', 'Nearby searches that fell back to $near.',
+         [({}, geo['fallbacks'])]),
+    ]
+
+    events = order_events.stats()
+    samples += [
+        ('order_event_subscribers', 'gauge', 'Open order stream connections.', [({}, events['subscribers'])]),
+        ('order_events_published_total', 'counter', 'Order events published.', [({}, events['published'])]),
+        ('order_events_dropped_total', 'counter', 'Order events dropped for slow subscribers.',
+         [({}, events['dropped'])]),
+    ]
+    return samples
+
+
+def init_app(app):
+    """Time every request and serve ``/metrics`` in Prometheus text format.
+
+    Off unless ``METRICS_ENABLED`` is set; scrapers must then send
+    ``METRICS_TOKEN`` as a bearer token.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return
+    if not app.config['METRICS_TOKEN']:
+        raise ValueError('METRICS_TOKEN must be set when METRICS_ENABLED is on')
+    command_metrics.enabled = True
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            http_request_duration.observe(time.perf_counter() - started, endpoint, request.method)
+            http_requests.inc(endpoint, request.method, str(response.status_code))
+        return response
+
+    def serve_metrics():
+        token = current_app.config['METRICS_TOKEN']
+        supplied = request.headers.get('Authorization', '').partition(' ')[2]
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', serve_metrics, methods=['GET'])
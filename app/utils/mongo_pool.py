@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from collections import deque
+from pymongo import ReadPreference
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.read_preferences import SecondaryPreferred
+
+logger = logging.getLogger(__name__)
+
+MIN_MAX_STALENESS = 90  # seconds; the server-selection spec minimum
+
+
+def client_options(config):
+    """MongoClient keyword arguments from ``MONGO_*`` settings; unset ones are left to the driver"""
+    options = {
+        'maxPoolSize': config['MONGO_MAX_POOL_SIZE'],
+        'minPoolSize': config['MONGO_MIN_POOL_SIZE'],
+        'maxIdleTimeMS': config['MONGO_MAX_IDLE_TIME_MS'],
+        'waitQueueTimeoutMS': config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        'serverSelectionTimeoutMS': config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        'connectTimeoutMS': config['MONGO_CONNECT_TIMEOUT_MS'],
+        'socketTimeoutMS': config['MONGO_SOCKET_TIMEOUT_MS'],
+        'compressors': config['MONGO_COMPRESSORS'],
+        'zlibCompressionLevel': config['MONGO_ZLIB_LEVEL'],
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def analytics_read_preference(config):
+    """Read preference for heavy read-only queries (``MONGO_ANALYTICS_READ_PREFERENCE``)"""
+    mode = config['MONGO_ANALYTICS_READ_PREFERENCE']
+    staleness = config['MONGO_ANALYTICS_MAX_STALENESS']
+    # The driver only rejects a smaller value when the first query selects a server
+    if staleness and staleness < MIN_MAX_STALENESS:
+        raise ValueError(f'MONGO_ANALYTICS_MAX_STALENESS must be at least {MIN_MAX_STALENESS} seconds')
+    if mode == 'secondaryPreferred':
+        return SecondaryPreferred(max_staleness=staleness) if staleness else SecondaryPreferred()
+    modes = {
+        'primary': ReadPreference.PRIMARY,
+        'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+        'secondary': ReadPreference.SECONDARY,
+        'nearest': ReadPreference.NEAREST
+    }
+    if mode not in modes:
+        raise ValueError(f'Unknown MONGO_ANALYTICS_READ_PREFERENCE: {mode}')
+    return modes[mode]
+
+
+class PoolMonitor(ConnectionPoolListener):
+    """Measures how long requests wait to check a connection out of the pool.
+
+    Waits are timed per thread between the driver's check-out-started and
+    checked-out events. Totals are kept since start, and percentiles are
+    taken over the most recent ``window`` checkouts. A wait longer than
+    ``slow_ms`` is logged, because it usually means the pool is too small
+    for the worker's concurrency.
+    """
+
+    def __init__(self, window=1000, slow_ms=100):
+        self.slow_ms = slow_ms
+        self.checkouts = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.open_connections = 0
+        self.pool_clears = 0
+        self._recent = deque(maxlen=window)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.slow_ms = app.config['MONGO_SLOW_CHECKOUT_MS']
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        if started is None:
+            return
+        self._local.started = None
+        wait = time.perf_counter() - started
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._recent.append(wait)
+        if wait * 1000 >= self.slow_ms:
+            logger.warning(f"Waited {wait * 1000:.1f} ms for a MongoDB connection to {event.address}")
+
+    def connection_check_out_failed(self, event):
+        self._local.started = None
+        with self._lock:
+            self.failures += 1
+        logger.warning(f"MongoDB connection checkout failed ({event.reason}) for {event.address}")
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    # The remaining pool events carry nothing we report
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts, total = self.checkouts, self.total_wait
+
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(len(recent) * p))] * 1000 if recent else 0.0
+
+        return {
+            'checkouts': checkouts,
+            'failures': self.failures,
+            'open_connections': self.open_connections,
+            'pool_clears': self.pool_clears,
+            'wait_ms_avg': (total / checkouts * 1000) if checkouts else 0.0,
+            'wait_ms_p50': percentile(0.5),
+            'wait_ms_p95': percentile(0.95),
+            'wait_ms_p99': percentile(0.99),
+            'wait_ms_max': self.max_wait * 1000
+        }
+
+
+pool_monitor = PoolMonitor()
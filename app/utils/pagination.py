@@ -0,0 +1,71 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import current_app, jsonify
+
+EPOCH = datetime(1970, 1, 1)
+
+def encode_cursor(value, _id):
+    """Opaque cursor for the position (value, _id) in a keyset-ordered list"""
+    payload = {
+        't': (value - EPOCH) // timedelta(milliseconds=1),
+        'id': str(_id),
+        'o': isinstance(_id, ObjectId)
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = EPOCH + timedelta(milliseconds=payload['t'])
+        _id = ObjectId(payload['id']) if payload['o'] else payload['id']
+        return value, _id
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def get_page_params(args):
+    """Read ``limit`` and ``cursor`` query parameters, clamping the page size"""
+    try:
+        limit = int(args.get('limit', current_app.config['DEFAULT_PAGE_SIZE']))
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    cursor = args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+def keyset_filter(cursor, field='created_at', direction=-1):
+    """Match documents strictly after ``cursor`` in (field, _id) order"""
+    value, _id = cursor
+    op = '$lt' if direction < 0 else '$gt'
+    return {'$or': [
+        {field: {op: value}},
+        {field: value, '_id': {op: _id}}
+    ]}
+
+def keyset_stages(match, limit, cursor=None, field='created_at', direction=-1):
+    """Leading $match/$sort/$limit stages for one page (fetches one extra row)"""
+    if cursor:
+        match = {**match, **keyset_filter(cursor, field, direction)}
+    return [
+        {'$match': match},
+        {'$sort': {field: direction, '_id': direction}},
+        {'$limit': limit + 1}
+    ]
+
+def split_page(docs, limit, field='created_at'):
+    """Trim the extra row and return (page, next_cursor or None)"""
+    if len(docs) <= limit:
+        return docs, None
+    page = docs[:limit]
+    last = page[-1]
+    return page, encode_cursor(last[field], last['_id'])
+
+def paginated_response(items, next_cursor):
+    """JSON list response; the next page's cursor travels in X-Next-Cursor"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
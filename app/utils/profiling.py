@@ -0,0 +1,317 @@
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from flask import abort, g, jsonify, request, send_from_directory
+
+logger = logging.getLogger(__name__)
+
+REQUEST_MODES = ('cpu', 'sample', 'memory')
+WINDOW_MODES = ('sample', 'memory')
+
+
+class StackSampler:
+    """Samples thread stacks every ``interval`` seconds into folded-stack counts.
+
+    ``thread_id`` limits sampling to one thread; otherwise every thread but
+    the sampler is sampled, rooted at its thread name. ``folded()`` is the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = 0
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.thread_id and thread_id != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                if not self.thread_id:
+                    stack.append(names.get(thread_id, str(thread_id)))
+                self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.counts.most_common())
+
+
+class CpuSession:
+    """Deterministic profile of the calling thread with cProfile"""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self, label):
+        self._profile.disable()
+        prof = self.profiler.output_path(label, 'cpu', 'prof')
+        self._profile.dump_stats(prof)
+        text = io.StringIO()
+        pstats.Stats(self._profile, stream=text).sort_stats('cumulative').print_stats(50)
+        return [os.path.basename(prof), self.profiler.write(label, 'cpu', 'txt', text.getvalue())]
+
+
+class SampleSession:
+    """Statistical CPU profile; cheap enough for a window over all threads"""
+
+    def __init__(self, profiler, thread_id=None):
+        self.profiler = profiler
+        self._sampler = StackSampler(profiler.sample_interval, thread_id)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self, label):
+        self._sampler.stop()
+        return [self.profiler.write(label, 'sample', 'folded', self._sampler.folded())]
+
+
+class MemorySession:
+    """Allocations made between two tracemalloc snapshots.
+
+    Writes the top differences by line and the grown bytes as folded
+    stacks, so a flamegraph shows where memory was allocated.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self._started_tracing = False
+        self._before = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.profiler.memory_frames)
+            self._started_tracing = True
+        self._before = self._snapshot()
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__, all_frames=True)
+        ])
+
+    def stop(self, label):
+        after = self._snapshot()
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        lines = after.compare_to(self._before, 'lineno')[:50]
+        report = ''.join(f'{stat}\n' for stat in lines)
+        folded = Counter()
+        for stat in after.compare_to(self._before, 'traceback'):
+            if stat.size_diff > 0:
+                stack = ';'.join(f'{os.path.basename(frame.filename)}:{frame.lineno}' for frame in stat.traceback)
+                folded[stack] += stat.size_diff
+        return [
+            self.profiler.write(label, 'memory', 'txt', report),
+            self.profiler.write(label, 'memory', 'folded',
+                                ''.join(f'{stack} {size}\n' for stack, size in folded.most_common()))
+        ]
+
+
+class Profiler:
+    """Opt-in CPU and memory profiling for one request or a time window.
+
+    Nothing is registered unless ``PROFILING_ENABLED`` is set, so a
+    disabled profiler costs nothing. When enabled, every use must carry
+    ``PROFILING_TOKEN``:
+
+    - a single request sends ``X-Profile: cpu|sample|memory`` and
+      ``X-Profile-Token``; the response names the files written in
+      ``X-Profile-Output``;
+    - ``POST /debug/profile`` with ``{"mode": "sample"|"memory",
+      "seconds": n}`` and a bearer token profiles the whole process in the
+      background; ``GET /debug/profile`` lists the output and
+      ``GET /debug/profile/<name>`` downloads a file.
+
+    Only one session runs at a time, because cProfile and tracemalloc are
+    process-wide. A request asking for a profile while one is running is
+    served normally, with ``X-Profile: busy``.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.token = None
+        self.directory = 'profiles'
+        self.sample_interval = 0.005
+        self.max_seconds = 60
+        self.memory_frames = 25
+        self.active = None
+        self._busy = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config['PROFILING_ENABLED']
+        if not self.enabled:
+            return
+        self.token = app.config['PROFILING_TOKEN']
+        if not self.token:
+            raise ValueError('PROFILING_TOKEN must be set when PROFILING_ENABLED is on')
+        self.directory = os.path.abspath(app.config['PROFILING_DIR'])
+        self.sample_interval = app.config['PROFILING_SAMPLE_INTERVAL']
+        self.max_seconds = app.config['PROFILING_MAX_SECONDS']
+        os.makedirs(self.directory, exist_ok=True)
+        logger.warning(f"Profiling is enabled; output goes to {self.directory}")
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._abandon_request)
+        app.add_url_rule('/debug/profile', 'profile_window', self._start_window, methods=['POST'])
+        app.add_url_rule('/debug/profile', 'profile_list', self._list_output, methods=['GET'])
+        app.add_url_rule('/debug/profile/<path:name>', 'profile_download', self._download, methods=['GET'])
+
+    def authorized(self, supplied):
+        return bool(supplied) and hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    # Output
+
+    def output_path(self, label, mode, ext):
+        label = re.sub(r'[^A-Za-z0-9_.-]+', '_', label)
+        return os.path.join(self.directory, f'{datetime.utcnow():%Y%m%dT%H%M%S%f}-{label}-{mode}.{ext}')
+
+    def write(self, label, mode, ext, content):
+        path = self.output_path(label, mode, ext)
+        with open(path, 'w') as f:
+            f.write(content)
+        return os.path.basename(path)
+
+    def _session(self, mode, thread_id=None):
+        if mode == 'cpu':
+            return CpuSession(self)
+        if mode == 'sample':
+            return SampleSession(self, thread_id)
+        return MemorySession(self)
+
+    # Single request
+
+    def _start_request(self):
+        mode = request.headers.get('X-Profile')
+        if not mode:
+            return None
+        if mode not in REQUEST_MODES:
+            return jsonify({'error': f"X-Profile must be one of {', '.join(REQUEST_MODES)}"}), 400
+        if not self.authorized(request.headers.get('X-Profile-Token')):
+            return jsonify({'error': 'Invalid profiling token'}), 401
+        if not self._busy.acquire(blocking=False):
+            g.profile_busy = True
+            return None
+        try:
+            session = self._session(mode, threading.get_ident())
+            session.start()
+        except Exception:
+            self._busy.release()
+            raise
+        self.active = {'mode': mode, 'endpoint': request.endpoint, 'started_at': datetime.utcnow()}
+        g.profile_session = session
+        return None
+
+    def _stop(self, session, label):
+        try:
+            return session.stop(label)
+        finally:
+            self.active = None
+            self._busy.release()
+
+    def _finish_request(self, response):
+        session = g.pop('profile_session', None)
+        if session is not None:
+            files = self._stop(session, request.endpoint or 'unmatched')
+            response.headers['X-Profile-Output'] = ', '.join(files)
+        elif g.pop('profile_busy', False):
+            response.headers['X-Profile'] = 'busy'
+        return response
+
+    def _abandon_request(self, exc):
+        # after_request did not run (the request failed before a response)
+        session = g.pop('profile_session', None)
+        if session is not None:
+            try:
+                self._stop(session, 'failed')
+            except Exception as e:
+                logger.error(f"Error writing profile of failed request: {str(e)}")
+
+    # Time window
+
+    def _check_bearer(self):
+        if not self.authorized(request.headers.get('Authorization', '').partition(' ')[2]):
+            abort(401)
+
+    def _start_window(self):
+        self._check_bearer()
+        data = request.get_json(silent=True) or {}
+        mode = data.get('mode', 'sample')
+        if mode not in WINDOW_MODES:
+            return jsonify({'error': f"mode must be one of {', '.join(WINDOW_MODES)}"}), 400
+        try:
+            seconds = float(data.get('seconds', 10))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'seconds must be a number'}), 400
+        if not 0 < seconds <= self.max_seconds:
+            return jsonify({'error': f'seconds must be between 0 and {self.max_seconds}'}), 400
+        if not self._busy.acquire(blocking=False):
+            return jsonify({'error': 'A profile is already running', 'active': self.active}), 409
+
+        try:
+            session = self._session(mode)
+            session.start()
+        except Exception:
+            self._busy.release()
+            raise
+        self.active = {'mode': mode, 'endpoint': None, 'started_at': datetime.utcnow(), 'seconds': seconds}
+        threading.Thread(target=self._run_window, args=(session, seconds),
+                         name='profiler-window', daemon=True).start()
+        return jsonify({'message': 'Profiling started', 'active': self.active}), 202
+
+    def _run_window(self, session, seconds):
+        time.sleep(seconds)
+        try:
+            files = self._stop(session, 'window')
+            logger.info(f"Profile window finished: {', '.join(files)}")
+        except Exception as e:
+            logger.error(f"Error writing window profile: {str(e)}")
+
+    def _list_output(self):
+        self._check_bearer()
+        files = []
+        for entry in sorted(os.scandir(self.directory), key=lambda e: e.name, reverse=True):
+            if entry.is_file():
+                files.append({'name': entry.name, 'size': entry.stat().st_size})
+        return jsonify({'active': self.active, 'files': files})
+
+    def _download(self, name):
+        self._check_bearer()
+        return send_from_directory(self.directory, name, as_attachment=True)
+
+
+profiler = Profiler()
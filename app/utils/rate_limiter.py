@@ -0,0 +1,212 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from pymongo import IndexModel
+from app.models.indexes import registry
+
+logger = logging.getLogger(__name__)
+
+
+class LoginThrottledError(Exception):
+    """Raised when a login attempt is refused before credentials are checked"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MemoryBackend:
+    """Per-process failure log; counts are not shared between workers.
+
+    Keys quiet for a full window are swept out once per window, and at most
+    ``max_keys`` are kept (least recently failed dropped first), so a spray
+    of distinct emails or IPs cannot grow the log without bound.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._attempts = OrderedDict()
+        self._last_sweep = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        with self._lock:
+            return {key: list(self._attempts.get(key, ())) for key in keys}
+
+    def add(self, key, ts, window, max_len):
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque(maxlen=max_len))
+            self._attempts.move_to_end(key)
+            attempts.append(ts)
+            while attempts and attempts[0] <= ts - window:
+                attempts.popleft()
+            if ts - self._last_sweep >= window:
+                self._sweep(ts - window)
+                self._last_sweep = ts
+            while len(self._attempts) > self.max_keys:
+                self._attempts.popitem(last=False)
+
+    def _sweep(self, horizon):
+        stale = [key for key, attempts in self._attempts.items() if not attempts or attempts[-1] <= horizon]
+        for key in stale:
+            del self._attempts[key]
+
+    def clear(self, key):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._attempts)
+
+
+class MongoBackend:
+    """Failure log shared by every worker through one small document per key.
+
+    Documents expire through a TTL index on ``expires_at`` once the key has
+    been quiet for a full window.
+    """
+
+    INDEXES = [
+        IndexModel([("expires_at", 1)], expireAfterSeconds=0)
+    ]
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get_many(self, keys):
+        docs = self.collection.find({'_id': {'$in': list(keys)}}, {'attempts': 1})
+        found = {doc['_id']: doc.get('attempts', []) for doc in docs}
+        return {key: found.get(key, []) for key in keys}
+
+    def add(self, key, ts, window, max_len):
+        self.collection.update_one(
+            {'_id': key},
+            {
+                '$push': {'attempts': {'$each': [ts], '$slice': -max_len}},
+                '$set': {'expires_at': datetime.utcfromtimestamp(ts + window)}
+            },
+            upsert=True
+        )
+
+    def clear(self, key):
+        self.collection.delete_one({'_id': key})
+
+    def keys(self):
+        return [doc['_id'] for doc in self.collection.find({}, {'_id': 1})]
+
+
+class LoginThrottle:
+    """Sliding-window limiter for failed logins, keyed by email and client IP.
+
+    Each key may fail ``delay_after`` times freely; after that every further
+    attempt must wait ``base_delay * 2 ** n`` seconds (capped at ``max_delay``)
+    since the previous failure. Reaching the per-key maximum inside
+    ``window`` locks the key until the oldest failure leaves the window.
+    """
+
+    def __init__(self, backend=None, window=900, max_email_failures=5,
+                 max_ip_failures=20, delay_after=3, base_delay=1, max_delay=60):
+        self.backend = backend or MemoryBackend()
+        self.window = window
+        self.max_email_failures = max_email_failures
+        self.max_ip_failures = max_ip_failures
+        self.delay_after = delay_after
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttled = 0
+        self.lockouts = 0
+
+    def init_app(self, app):
+        if app.config['LOGIN_THROTTLE_BACKEND'] == 'mongo':
+            self.backend = MongoBackend(app.db.login_failures)
+        else:
+            self.backend.max_keys = app.config['LOGIN_THROTTLE_MAX_KEYS']
+        self.window = app.config['LOGIN_FAILURE_WINDOW']
+        self.max_email_failures = app.config['LOGIN_MAX_FAILURES_PER_EMAIL']
+        self.max_ip_failures = app.config['LOGIN_MAX_FAILURES_PER_IP']
+        self.delay_after = app.config['LOGIN_DELAY_AFTER']
+        self.base_delay = app.config['LOGIN_BASE_DELAY']
+        self.max_delay = app.config['LOGIN_MAX_DELAY']
+
+    def _keys(self, email, ip):
+        keys = {}
+        if email:
+            keys[f"email:{email.strip().lower()}"] = self.max_email_failures
+        if ip:
+            keys[f"ip:{ip}"] = self.max_ip_failures
+        return keys
+
+    def _state(self, attempts, limit, now):
+        """Return (failures in window, seconds until the next attempt is allowed)"""
+        recent = sorted(ts for ts in attempts if ts > now - self.window)
+        if not recent:
+            return 0, 0
+        if len(recent) >= limit:
+            return len(recent), recent[-limit] + self.window - now
+        excess = len(recent) - self.delay_after
+        if excess < 0:
+            return len(recent), 0
+        delay = min(self.max_delay, self.base_delay * 2 ** excess)
+        return len(recent), max(0, recent[-1] + delay - now)
+
+    def check(self, email, ip):
+        """Raise LoginThrottledError if either key must wait"""
+        keys = self._keys(email, ip)
+        if not keys:
+            return
+        now = time.time()
+        attempts = self.backend.get_many(keys)
+        for key, limit in keys.items():
+            failures, wait = self._state(attempts[key], limit, now)
+            if wait > 0:
+                self.throttled += 1
+                retry_after = int(math.ceil(wait))
+                if failures >= limit:
+                    raise LoginThrottledError(
+                        'Too many failed login attempts, account temporarily locked', retry_after)
+                raise LoginThrottledError('Too many failed login attempts, please retry later', retry_after)
+
+    def record_failure(self, email, ip):
+        now = time.time()
+        for key, limit in self._keys(email, ip).items():
+            self.backend.add(key, now, self.window, limit)
+        # Only the email key is re-read, for the lockout log line
+        for key, limit in self._keys(email, None).items():
+            failures, _ = self._state(self.backend.get_many([key])[key], limit, now)
+            if failures == limit:
+                self.lockouts += 1
+                logger.warning(f"Login locked out for {key} after {failures} failures from {ip}")
+
+    def record_success(self, email):
+        for key in self._keys(email, None):
+            self.backend.clear(key)
+
+    def status(self):
+        """Current throttle state per key, for operators"""
+        now = time.time()
+        keys = self.backend.keys()
+        attempts = self.backend.get_many(keys)
+        report = []
+        for key in keys:
+            limit = self.max_email_failures if key.startswith('email:') else self.max_ip_failures
+            failures, wait = self._state(attempts[key], limit, now)
+            if failures:
+                report.append({
+                    'key': key,
+                    'failures': failures,
+                    'locked': failures >= limit,
+                    'retry_after': int(math.ceil(wait))
+                })
+        return report
+
+    def stats(self):
+        return {'throttled': self.throttled, 'lockouts': self.lockouts}
+
+
+login_throttle = LoginThrottle()
+
+registry.register('login_failures', MongoBackend.INDEXES)
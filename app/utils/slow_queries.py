@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from flask import has_request_context, request
+from pymongo.errors import CollectionInvalid, PyMongoError
+from pymongo.monitoring import CommandListener
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from app.utils.cache import ExpiringLRUCache
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+slow_queries_total = metrics.counter(
+    'mongo_slow_queries_total', 'MongoDB commands slower than MONGO_SLOW_QUERY_MS.', ('collection', 'command'))
+slow_query_plans = metrics.counter(
+    'mongo_slow_query_plans_total', 'Verdicts from sampled explains of slow commands.', ('collection', 'verdict'))
+
+# Command fields that describe what a query does; everything else is options or payload
+SHAPE_FIELDS = ('filter', 'query', 'pipeline', 'sort', 'projection', 'hint', 'key',
+                'update', 'updates', 'deletes', 'limit', 'skip')
+# Values kept verbatim: field names, sort directions and join definitions, never user data
+STRUCTURAL_KEYS = {'sort', '$sort', 'hint', 'key', 'limit', '$limit',
+                   'skip', '$skip', 'from', 'localField', 'foreignField', 'as', '$unwind', '$count'}
+# Projections keep field names, 0/1 and $-paths; computed values are redacted
+PROJECTION_KEYS = {'projection', '$project', 'fields'}
+EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete'}
+IGNORED_COMMANDS = {'explain', 'hello', 'isMaster', 'ismaster', 'ping', 'buildInfo', 'saslStart',
+                    'saslContinue', 'endSessions', 'killCursors', 'createIndexes', 'listIndexes'}
+SESSION_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'writeConcern', 'readConcern'}
+READ_PREFERENCES = {
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest
+}
+
+
+def redact(value):
+    """Filter shape of ``value``: literals become ``'?'``, field paths and structure stay"""
+    if isinstance(value, dict):
+        return {
+            key: item if key in STRUCTURAL_KEYS else redact_projection(item) if key in PROJECTION_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        if all(not isinstance(item, (dict, list, tuple)) for item in value):
+            return ['?'] if value else []  # $in lists and the like: length is data too
+        return [redact(item) for item in value]
+    if isinstance(value, str) and value.startswith('$'):
+        return value
+    return '?'
+
+
+def redact_projection(value):
+    """Projection shape: inclusion flags and $-paths stay, anything computed is redacted"""
+    if isinstance(value, dict):
+        return {key: redact_projection(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return redact(value)
+    if isinstance(value, (bool, int)) and value in (0, 1):
+        return value
+    if isinstance(value, str) and value.startswith('$'):
+        return value
+    return '?'
+
+
+def read_preference_of(command):
+    """The read preference a command was sent with (``$readPreference``), primary if none"""
+    spec = command.get('$readPreference') or {}
+    preference = READ_PREFERENCES.get(spec.get('mode'))
+    if preference is None:
+        return Primary()
+    return preference(tag_sets=spec.get('tags'), max_staleness=spec.get('maxStalenessSeconds', -1))
+
+
+def shape_json(shape):
+    return json.dumps(shape, sort_keys=True, default=str)
+
+
+def command_shape(command):
+    shape = redact({field: command[field] for field in SHAPE_FIELDS if field in command})
+    if 'updates' in shape:
+        shape['updates'] = [{'q': u.get('q'), 'u': u.get('u')} for u in shape['updates'] if isinstance(u, dict)]
+    if 'deletes' in shape:
+        shape['deletes'] = [{'q': d.get('q')} for d in shape['deletes'] if isinstance(d, dict)]
+    return shape
+
+
+def plan_verdicts(explain):
+    """COLLSCAN / MISSING_INDEX / IN_MEMORY_SORT findings from explain output, or ['OK']"""
+    verdicts = set()
+
+    def walk(node):
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+        elif isinstance(node, dict):
+            stage = node.get('stage')
+            if stage == 'COLLSCAN':
+                verdicts.add('COLLSCAN')
+                if node.get('filter'):
+                    verdicts.add('MISSING_INDEX')
+            elif stage == 'SORT' or '$sort' in node:
+                verdicts.add('IN_MEMORY_SORT')
+            for key, item in node.items():
+                # The echoed command and the losing plans say nothing about what ran
+                if key not in ('command', 'rejectedPlans', '$sort'):
+                    walk(item)
+
+    walk(explain)
+    return sorted(verdicts) or ['OK']
+
+
+class SlowQueryRecorder(CommandListener):
+    """Records MongoDB commands slower than ``threshold_ms``.
+
+    The listener itself only times commands; a slow one is turned into a
+    redacted record and handed to a background thread, so request threads
+    never wait on logging, explains or storage. That thread:
+
+    - samples ``explain_rate`` of explainable slow commands and runs a
+      ``queryPlanner`` explain, at most once per filter shape every
+      ``explain_interval`` seconds (other records reuse the last verdicts);
+    - passes each record to every sink: the log, the capped ``collection``
+      when configured, and anything added with ``add_sink``.
+
+    Records are dropped rather than queued without bound if the thread
+    falls behind.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.threshold_ms = 100
+        self.explain_rate = 0.1
+        self.explain_interval = 600
+        self.collection = None
+        self.collection_size = 16 * 1024 * 1024
+        self.recorded = 0
+        self.dropped = 0
+        self.explained = 0
+        self.plans = ExpiringLRUCache(maxsize=1000, name='slow_query_plans')
+        self._sinks = [self._log]
+        self._pending = {}  # (request_id, connection_id) -> (command, database, endpoint)
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._collection_ready = False
+
+    def init_app(self, app):
+        self.enabled = app.config['MONGO_SLOW_QUERY_ENABLED']
+        self.threshold_ms = app.config['MONGO_SLOW_QUERY_MS']
+        self.explain_rate = app.config['MONGO_SLOW_QUERY_EXPLAIN_RATE']
+        self.explain_interval = app.config['MONGO_SLOW_QUERY_EXPLAIN_INTERVAL']
+        self.collection = app.config['MONGO_SLOW_QUERY_COLLECTION'] or None
+        self.collection_size = app.config['MONGO_SLOW_QUERY_COLLECTION_SIZE']
+        if self.collection and self._store not in self._sinks:
+            self._sinks.append(self._store)
+
+    def add_sink(self, sink):
+        """Call ``sink(record)`` for every slow command, from the recorder thread"""
+        self._sinks.append(sink)
+
+    # Listener
+
+    def started(self, event):
+        if not self.enabled or event.command_name in IGNORED_COMMANDS:
+            return
+        endpoint = request.endpoint if has_request_context() else None
+        self._pending[(event.request_id, event.connection_id)] = (event.command, event.database_name, endpoint)
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.request_id, event.connection_id), None)
+        if pending and event.duration_micros >= self.threshold_ms * 1000:
+            self._record(event, *pending)
+
+    def failed(self, event):
+        self._pending.pop((event.request_id, event.connection_id), None)
+
+    def _record(self, event, command, database, endpoint):
+        target = command.get('collection') if event.command_name == 'getMore' else command.get(event.command_name)
+        collection = target if isinstance(target, str) else ''
+        if collection and collection == self.collection:
+            return
+        shape = command_shape(command)
+        shape_id = hashlib.sha1(
+            f'{collection}\x1f{event.command_name}\x1f{shape_json(shape)}'.encode('utf-8')
+        ).hexdigest()[:16]
+        record = {
+            'at': datetime.utcnow(),
+            'database': database,
+            'collection': collection,
+            'command': event.command_name,
+            'duration_ms': round(event.duration_micros / 1000, 1),
+            'endpoint': endpoint,
+            'shape_id': shape_id,
+            'shape': shape,
+            'verdicts': None
+        }
+        slow_queries_total.inc(collection, event.command_name)
+        explain = event.command_name in EXPLAINABLE and random.random() < self.explain_rate
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((record, command if explain else None))
+        except queue.Full:
+            self.dropped += 1
+
+    # Background thread
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='slow-queries', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            record, command = self._queue.get()
+            try:
+                record['verdicts'] = self._verdicts(record, command)
+                for sink in self._sinks:
+                    sink(record)
+                self.recorded += 1
+            except Exception as e:
+                logger.error(f"Error recording slow query: {str(e)}")
+
+    def _verdicts(self, record, command):
+        verdicts = self.plans.get(record['shape_id'])
+        if verdicts is not None or command is None:
+            return verdicts
+        verdicts = plan_verdicts(self.explain(record['database'], command))
+        self.explained += 1
+        self.plans.set(record['shape_id'], verdicts, time.time() + self.explain_interval)
+        for verdict in verdicts:
+            slow_query_plans.inc(record['collection'], verdict)
+        return verdicts
+
+    @staticmethod
+    def explain(database, command):
+        from app import db
+        explainable = {key: value for key, value in command.items()
+                       if not key.startswith('$') and key not in SESSION_FIELDS}
+        # explain takes a single update or delete statement
+        for statements in ('updates', 'deletes'):
+            if statements in explainable:
+                explainable[statements] = explainable[statements][:1]
+        # Explain on the same kind of node the command ran on (analytics reads go to secondaries)
+        return db.client[database].command('explain', explainable, verbosity='queryPlanner',
+                                           read_preference=read_preference_of(command))
+
+    # Sinks
+
+    @staticmethod
+    def _log(record):
+        verdicts = ', '.join(record['verdicts']) if record['verdicts'] else 'not explained'
+        logger.warning(
+            f"Slow MongoDB {record['command']} on {record['collection']} took {record['duration_ms']} ms "
+            f"({record['endpoint'] or 'no request'}; plan: {verdicts}): "
+            f"{shape_json(record['shape'])}"
+        )
+
+    def _store(self, record):
+        from app import db
+        if not self._collection_ready:
+            try:
+                db.create_collection(self.collection, capped=True, size=self.collection_size)
+            except CollectionInvalid:
+                pass  # already exists
+            self._collection_ready = True
+        try:
+            # Shapes hold $-prefixed operator names, so they are stored as text
+            db[self.collection].insert_one(dict(record, shape=shape_json(record['shape'])))
+        except PyMongoError as e:
+            logger.error(f"Error storing slow query record: {str(e)}")
+
+    def stats(self):
+        return {
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'explained': self.explained,
+            'queued': self._queue.qsize()
+        }
+
+
+slow_queries = SlowQueryRecorder()
+
+
+def top_shapes(database, collection, limit=20):
+    """Slowest filter shapes in the capped collection, by total time spent"""
+    return list(database[collection].aggregate([
+        {'$group': {
+            '_id': '$shape_id',
+            'collection': {'$last': '$collection'},
+            'command': {'$last': '$command'},
+            'shape': {'$last': '$shape'},
+            'endpoints': {'$addToSet': '$endpoint'},
+            'verdicts': {'$last': '$verdicts'},
+            'count': {'$sum': 1},
+            'total_ms': {'$sum': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'last_seen': {'$max': '$at'}
+        }},
+        {'$sort': {'total_ms': -1}},
+        {'$limit': limit}
+    ]))
@@ -0,0 +1,109 @@
+"""Compare the old in-Python dashboard stats with the $facet pipeline.
+
+Seeds a throwaway shop with synthetic orders in the database named by
+MONGO_URI, times both implementations and reports peak Python memory.
+
+    MONGO_URI=mongodb://localhost:27017/pressto_bench python -m benchmarks.dashboard_stats 50000
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import MongoClient
+
+STATUSES = ['pending', 'accepted', 'pickedUp', 'inProgress', 'completed', 'delivered', 'cancelled']
+SERVICES = ['Wash & Fold', 'Dry Clean', 'Iron', 'Shoe Care', 'Curtains', 'Blankets']
+
+def seed(db, shop_id, count):
+    now = datetime.utcnow()
+    batch = []
+    for _ in range(count):
+        batch.append({
+            'shop_id': shop_id,
+            'customer_id': ObjectId(),
+            'status': random.choice(STATUSES),
+            'total_amount': round(random.uniform(5, 120), 2),
+            'items': [
+                {'type': random.choice(SERVICES), 'count': random.randint(1, 6)}
+                for _ in range(random.randint(1, 3))
+            ],
+            'created_at': now - timedelta(minutes=random.randint(0, 365 * 24 * 60))
+        })
+        if len(batch) == 5000:
+            db.orders.insert_many(batch)
+            batch = []
+    if batch:
+        db.orders.insert_many(batch)
+
+def legacy_stats(db, shop_id, start_date, end_date, groups):
+    """The previous get_dashboard_stats body, kept here for comparison"""
+    orders = list(db.orders.find({
+        'shop_id': shop_id,
+        'created_at': {'$gte': start_date, '$lte': end_date}
+    }).sort('created_at', -1))
+    stats = {
+        'overview': {
+            'totalOrders': len(orders),
+            'totalRevenue': sum(order.get('total_amount', 0) for order in orders),
+            'newOrders': sum(1 for order in orders if order['status'] in groups['new']),
+            'processingOrders': sum(1 for order in orders if order['status'] in groups['processing']),
+            'readyOrders': sum(1 for order in orders if order['status'] in groups['ready']),
+            'completedOrders': sum(1 for order in orders if order['status'] in groups['history'])
+        }
+    }
+    revenue_by_day = {}
+    for order in orders:
+        date = order['created_at'].strftime('%Y-%m-%d')
+        revenue_by_day[date] = revenue_by_day.get(date, 0) + order.get('total_amount', 0)
+    stats['revenueByDay'] = [{'date': d, 'revenue': a} for d, a in sorted(revenue_by_day.items())]
+    status_count = {}
+    for order in orders:
+        status_count[order['status']] = status_count.get(order['status'], 0) + 1
+    stats['ordersByStatus'] = [{'status': s, 'count': c} for s, c in status_count.items()]
+    service_count = {}
+    for order in orders:
+        for item in order.get('items', []):
+            service_count[item['type']] = service_count.get(item['type'], 0) + item.get('count', 0)
+    stats['topServices'] = [
+        {'name': s, 'count': c}
+        for s, c in sorted(service_count.items(), key=lambda x: x[1], reverse=True)
+    ][:5]
+    return stats
+
+def measure(label, fn, repeat=5):
+    timings = []
+    tracemalloc.start()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    print(f"{label:<10} median {timings[len(timings) // 2] * 1000:8.1f} ms   "
+          f"peak python memory {peak / 1024 / 1024:7.2f} MiB")
+
+def main():
+    from app.models.order import Order
+    from app.services.shop_service import ShopService
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    db = MongoClient(os.environ['MONGO_URI']).get_default_database()
+    db.orders.create_index([('shop_id', 1), ('created_at', -1), ('_id', -1)])
+    shop_id = ObjectId()
+    seed(db, shop_id, count)
+    try:
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=365)
+        pipeline = ShopService.dashboard_pipeline(shop_id, start_date, end_date)
+        print(f"{count} orders over one year")
+        measure('python', lambda: legacy_stats(db, shop_id, start_date, end_date, Order.STATUS_GROUPS))
+        measure('$facet', lambda: next(db.orders.aggregate(pipeline)))
+    finally:
+        db.orders.delete_many({'shop_id': shop_id})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Time the pickup route planner on synthetic stops around one shop.
+
+Compares building the distance matrix with scalar calculate_distance calls
+against the vectorized distance_matrix, and reports the route length in
+booking order, after nearest neighbour, and after 2-opt.
+
+    python -m benchmarks.pickup_route 100 300 800
+"""
+import random
+import sys
+import time
+import numpy as np
+
+SHOP = [77.5946, 12.9716]
+SPREAD = 0.12  # degrees, roughly a 13 km square around the shop
+
+def random_stops(count):
+    return [
+        [SHOP[0] + random.uniform(-SPREAD, SPREAD), SHOP[1] + random.uniform(-SPREAD, SPREAD)]
+        for _ in range(count)
+    ]
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+def tour_length(matrix, tour):
+    return float(matrix[tour[:-1], tour[1:]].sum())
+
+def main():
+    from app.services.route_service import RouteService
+    from app.utils.helpers import calculate_distance, distance_matrix
+
+    random.seed(7)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 300, 500]
+    print(f"{'stops':>6} {'scalar ms':>10} {'matrix ms':>10} {'plan ms':>9} "
+          f"{'booked km':>10} {'greedy km':>10} {'2-opt km':>9}")
+    for size in sizes:
+        points = [SHOP] + random_stops(size)
+        _, scalar_ms = timed(lambda: [[calculate_distance(a, b) for b in points] for a in points])
+        matrix, matrix_ms = timed(lambda: distance_matrix(points))
+
+        closed = lambda tour: np.append(tour, 0)
+        booked = tour_length(matrix, closed(np.arange(size + 1)))
+        greedy = tour_length(matrix, closed(RouteService.nearest_neighbour(matrix)))
+        (order, legs), plan_ms = timed(lambda: RouteService.plan(SHOP, points[1:]))
+
+        print(f"{size:>6} {scalar_ms:>10.1f} {matrix_ms:>10.1f} {plan_ms:>9.1f} "
+              f"{booked:>10.1f} {greedy:>10.1f} {sum(legs):>9.1f}")
+
+if __name__ == '__main__':
+    main()